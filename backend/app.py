@@ -1,6 +1,10 @@
-from flask import Flask, jsonify
+from flask import Flask, Response, g, jsonify
 from flask_cors import CORS
 from config import Config
+from invalidation import start_bus
+from metrics import render_metrics
+from db import release_request_connection, PoolExhausted
+from models import load_search_index, load_suggest_index, load_catalogue_index, load_catalogue
 import os
 
 from auth.routes import auth_bp
@@ -19,6 +23,27 @@ def create_app():
     app.register_blueprint(orders_bp)
     app.register_blueprint(manager_bp)
     
+    #keeps this worker's cache in step with edits made in other workers
+    start_bus()
+    
+    if Config.CATALOGUE_SNAPSHOT:
+        load_catalogue()
+    if Config.SEARCH_ENGINE == 'trigram':
+        load_search_index()
+    if Config.SUGGEST_ENABLED:
+        load_suggest_index()
+    if Config.CATALOGUE_INDEX_ENABLED:
+        load_catalogue_index()
+    
+    #each request borrows one pooled connection for all of its queries
+    app.teardown_appcontext(release_request_connection)
+    
+    if Config.DEBUG:
+        @app.after_request
+        def add_round_trips(response):
+            response.headers['X-DB-Round-Trips'] = str(g.get('db_round_trips', 0))
+            return response
+    
     @app.route('/')
     def index():
         return jsonify({
@@ -26,9 +51,10 @@ def create_app():
             'version': '1.0',
             'endpoints': {
                 'auth': '/api/auth/register, /api/auth/login',
-                'books': '/api/books',
+                'books': '/api/books, /api/books/suggest',
                 'orders': '/api/orders',
-                'manager': '/api/manager/orders, /api/manager/books'
+                'manager': '/api/manager/orders, /api/manager/books, /api/manager/cache/stats',
+                'metrics': '/metrics'
             }
         })
     
@@ -36,10 +62,22 @@ def create_app():
     def health():
         return jsonify({'status': 'healthy'}), 200
     
+    @app.route('/metrics')
+    def metrics():
+        return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
+    
     @app.errorhandler(404)
     def not_found(error):
         return jsonify({'error': 'Endpoint not found'}), 404
     
+    @app.errorhandler(PoolExhausted)
+    def pool_exhausted(error):
+        #every connection busy for too long, ask the client to come back shortly
+        response = jsonify({'error': f'Server busy, please retry: {str(error)}'})
+        response.status_code = 503
+        response.headers['Retry-After'] = str(Config.DB_POOL_RETRY_AFTER)
+        return response
+    
     @app.errorhandler(500)
     def internal_error(error):
         return jsonify({'error': 'Internal server error'}), 500
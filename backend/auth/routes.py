@@ -5,6 +5,7 @@ from datetime import datetime, timedelta
 from config import Config
 from models import create_user, get_user_by_username, get_user_by_email
 from functools import wraps
+from db import PoolExhausted, release_connection
 
 auth_bp = Blueprint('auth', __name__, url_prefix='/api/auth')
 
@@ -85,6 +86,8 @@ def register():
     if get_user_by_email(email):
         return jsonify({'error': 'Email already exists'}), 409
     
+    #bcrypt takes a while, create_user checks out a connection of its own
+    release_connection()
     password_hash = hash_password(password)
     
     try:
@@ -94,6 +97,8 @@ def register():
             'user_id': user_id,
             'username': username
         }), 201
+    except PoolExhausted:
+        raise
     except Exception as e:
         return jsonify({'error': f'Registration failed: {str(e)}'}), 500
 
@@ -108,6 +113,8 @@ def login():
     password = data['password']
     
     user = get_user_by_username(username)
+    #that was the only query, don't hold a pool slot through bcrypt
+    release_connection()
     
     if not user or not verify_password(password, user['password_hash']):
         return jsonify({'error': 'Invalid username or password'}), 401
@@ -0,0 +1 @@
+#Benchmarks module init file
\ No newline at end of file
@@ -0,0 +1,45 @@
+#cache throughput with more and more threads, one lock vs striped locks
+#run from backend/: python -m benchmarks.cache_contention
+import threading
+import time
+from cache import SimpleCache
+
+KEYS = [f"books:{i}" for i in range(512)]
+SECONDS = 2
+
+def run(cache, threads):
+    for key in KEYS:
+        cache.set(key, [1, 2, 3], ttl_seconds=3600)
+    stop = threading.Event()
+    counts = [0] * threads
+
+    def worker(n):
+        #mostly reads, like catalogue traffic
+        i = n
+        done = 0
+        while not stop.is_set():
+            for _ in range(100):
+                key = KEYS[i % len(KEYS)]
+                if i % 10 == 0:
+                    cache.set(key, [1, 2, 3], ttl_seconds=3600)
+                else:
+                    cache.get(key)
+                i += 7
+            done += 100
+        counts[n] = done
+
+    pool = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    for t in pool:
+        t.start()
+    time.sleep(SECONDS)
+    stop.set()
+    for t in pool:
+        t.join()
+    return sum(counts) / SECONDS
+
+if __name__ == '__main__':
+    print(f"{'threads':>8} {'1 stripe':>14} {'16 stripes':>14}")
+    for threads in (1, 2, 4, 8, 16):
+        single = run(SimpleCache(stripes=1), threads)
+        striped = run(SimpleCache(stripes=16), threads)
+        print(f"{threads:>8} {single:>12,.0f}/s {striped:>12,.0f}/s")
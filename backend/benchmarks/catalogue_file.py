@@ -0,0 +1,69 @@
+#memory use and read latency of the two catalogue stores, a per-worker
+#CatalogueSnapshot against the mapped CatalogueFile
+#runs on generated books, no database needed
+#run from backend/: python -m benchmarks.catalogue_file [books]
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from decimal import Decimal
+from catalogue import CatalogueSnapshot
+from catalogue_file import CatalogueFile
+from benchmarks.trigram_index import generate
+
+def rows(count):
+    stamp = datetime(2024, 1, 1)
+    for book in generate(count):
+        book['price_buy'] = Decimal(str(book['price_buy']))
+        book['price_rent'] = Decimal(str(book['price_rent']))
+        book['available'] = int(book['available'])
+        book['created_at'] = book['updated_at'] = stamp
+        yield book
+
+def timed(call, repeats=1000):
+    times = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        call()
+        times.append((time.perf_counter() - started) * 1e6)
+    return statistics.median(times)
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    books = list(rows(count))
+    path = os.path.join(tempfile.mkdtemp(), 'catalogue.bin')
+
+    tracemalloc.start()
+    memory = CatalogueSnapshot(('title', 'author', 'price_buy'))
+    started = time.perf_counter()
+    memory.build(books)
+    memory_seconds = time.perf_counter() - started
+    memory_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    started = time.perf_counter()
+    mapped = CatalogueFile(path)
+    mapped.build(books)
+    file_seconds = time.perf_counter() - started
+
+    print(f"{count:,} books")
+    print(f"{'store':<8} {'build s':>8} {'MiB':>8}")
+    print(f"{'memory':<8} {memory_seconds:>8.1f} {memory_bytes / 2 ** 20:>8.1f}   private to each worker")
+    print(f"{'file':<8} {file_seconds:>8.1f} {mapped.stats()['bytes'] / 2 ** 20:>8.1f}   shared page cache")
+
+    book_id = books[count // 2]['id']
+    middle = memory.page('title')[count // 3]
+    after = (middle['title'], middle['id'])
+    reads = {
+        'get by id': lambda store: store.get(book_id),
+        'first 50 by title': lambda store: store.page('title', 50),
+        'page after cursor': lambda store: store.page('title', 50, after=after),
+        'page by price desc': lambda store: store.page('price_buy', 50, descending=True),
+    }
+    print(f"{'median us':<20} {'memory':>10} {'file':>10}")
+    for name, read in reads.items():
+        assert read(memory) == read(mapped)
+        print(f"{name:<20} {timed(lambda: read(memory)):>10,.1f} {timed(lambda: read(mapped)):>10,.1f}")
@@ -0,0 +1,56 @@
+#build time and per-query latency of the price/author index behind filtered
+#GET /api/books, next to a plain scan of the same rows
+#runs on generated books, no database needed
+#run from backend/: python -m benchmarks.catalogue_index [books]
+import statistics
+import sys
+import time
+from catalogue_index import CatalogueIndex, normalize
+from benchmarks.trigram_index import generate
+
+def timed(call, repeats=20):
+    times = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        result = call()
+        times.append((time.perf_counter() - started) * 1000)
+    return statistics.median(times), result
+
+def scan(books, low, high, author):
+    #what a WHERE clause without a usable index amounts to
+    matches = [book for book in books
+               if book['available'] and low <= book['price_buy'] <= high
+               and (author is None or normalize(book['author']) == author)]
+    matches.sort(key=lambda book: (book['price_buy'], book['id']))
+    return len(matches)
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    books = list(generate(count))
+
+    index = CatalogueIndex()
+    started = time.perf_counter()
+    index.build(books)
+    stats = index.stats()
+    print(f"{count:,} books: built in {time.perf_counter() - started:.1f}s, {stats['authors']:,} authors")
+
+    author = normalize(books[count // 2]['author'])
+    queries = {
+        'narrow price': (10.0, 10.5, None),
+        'wide price': (5.0, 50.0, None),
+        'author': (0.0, 1000.0, author),
+        'author + price': (10.0, 20.0, author),
+    }
+    print(f"{'query':<16} {'index ms':>10} {'scan ms':>10} {'matches':>10}")
+    for name, (low, high, by) in queries.items():
+        index_ms, (page, last, total) = timed(
+            lambda: index.query('buy', low, high, by, sort='price', limit=50))
+        scan_ms, scanned = timed(lambda: scan(books, low, high, by), repeats=3)
+        assert total == scanned
+        print(f"{name:<16} {index_ms:>10,.2f} {scan_ms:>10,.1f} {total:>10,}")
+
+    started = time.perf_counter()
+    for book in books[:10000]:
+        index.upsert(book['id'], book['title'], book['author'],
+                     book['price_buy'] + 1, book['price_rent'], book['available'])
+    print(f"10,000 edits: {(time.perf_counter() - started) * 1000:,.0f} ms")
@@ -0,0 +1,137 @@
+#LIKE '%q%' vs MATCH ... AGAINST on a generated catalogue
+#fills books_search_bench with [rows] generated books the first time (kept for
+#later runs, DROP TABLE books_search_bench to get rid of it)
+#run from backend/: python -m benchmarks.fulltext_search [rows] [repeats]
+import random
+import statistics
+import sys
+import time
+from db import get_db_connection
+
+TABLE = 'books_search_bench'
+SYLLABLES = ['ka', 'lo', 'mi', 'ra', 'ven', 'dor', 'sha', 'tel', 'um', 'bri',
+             'no', 'fen', 'gal', 'is', 'tor', 'wen', 'ex', 'quin', 'ly', 'zor']
+
+def make_words(count, rng):
+    words = set()
+    while len(words) < count:
+        words.add(''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))))
+    words = sorted(words)
+    rng.shuffle(words)
+    return words
+
+def fill(cursor, conn, rows):
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {TABLE} (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            title VARCHAR(255) NOT NULL,
+            author VARCHAR(100) NOT NULL,
+            price_buy DECIMAL(10, 2) NOT NULL,
+            price_rent DECIMAL(10, 2) NOT NULL,
+            available BOOLEAN DEFAULT TRUE,
+            INDEX idx_title (title),
+            INDEX idx_author (author)
+        )
+    """)
+    cursor.execute(f"SELECT COUNT(*) FROM {TABLE}")
+    existing = cursor.fetchone()[0]
+
+    #title words follow a zipf-like spread, a few are everywhere and most are rare
+    rng = random.Random(42)
+    words = make_words(5000, rng)
+    weights = [1 / rank for rank in range(1, len(words) + 1)]
+    first_names = [word.title() for word in make_words(200, rng)]
+    surnames = [word.title() for word in make_words(2000, rng)]
+
+    if existing < rows:
+        print(f"generating {rows - existing:,} books...")
+        started = time.perf_counter()
+        batch = []
+        for _ in range(rows - existing):
+            title = ' '.join(rng.choices(words, weights, k=rng.randint(2, 5))).title()
+            author = f"{rng.choice(first_names)} {rng.choice(surnames)}"
+            price = round(rng.uniform(5, 60), 2)
+            batch.append((title, author, price, round(price / 4, 2), rng.random() > 0.05))
+            if len(batch) == 10000:
+                cursor.executemany(
+                    f"INSERT INTO {TABLE} (title, author, price_buy, price_rent, available) VALUES (%s, %s, %s, %s, %s)",
+                    batch
+                )
+                conn.commit()
+                batch = []
+        if batch:
+            cursor.executemany(
+                f"INSERT INTO {TABLE} (title, author, price_buy, price_rent, available) VALUES (%s, %s, %s, %s, %s)",
+                batch
+            )
+            conn.commit()
+        print(f"generated in {time.perf_counter() - started:.1f}s")
+
+    #built after the bulk insert, much faster than maintaining it row by row
+    cursor.execute(f"SHOW INDEX FROM {TABLE} WHERE Key_name = 'ft_title_author'")
+    if not cursor.fetchall():
+        print("building FULLTEXT index...")
+        started = time.perf_counter()
+        cursor.execute(f"ALTER TABLE {TABLE} ADD FULLTEXT INDEX ft_title_author (title, author)")
+        print(f"built in {time.perf_counter() - started:.1f}s")
+
+    return {
+        'common word': words[0],
+        'mid word': words[100],
+        'rare word': words[3000],
+        'two words': f"{words[4]} {words[40]}",
+        'author surname': surnames[7],
+    }
+
+def timed(cursor, query, params, repeats):
+    times = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        cursor.execute(query, params)
+        count = len(cursor.fetchall())
+        times.append((time.perf_counter() - started) * 1000)
+    return statistics.median(times), count
+
+def like(keyword):
+    #what models.search_books ran before, a phrase anywhere in title or author
+    term = f"%{keyword}%"
+    query = f"""
+        SELECT * FROM {TABLE} WHERE available = TRUE
+        AND (title LIKE %s OR author LIKE %s) ORDER BY title
+    """
+    return query, (term, term)
+
+def fulltext(keyword, mode):
+    #same shape as models.search_books with SEARCH_ENGINE=fulltext
+    if mode == 'BOOLEAN MODE':
+        against = ' '.join(f'+{word}*' for word in keyword.split())
+    else:
+        against = keyword
+    match = f"MATCH(title, author) AGAINST (%s IN {mode})"
+    query = f"""
+        SELECT * FROM {TABLE} WHERE available = TRUE
+        AND {match} ORDER BY {match} DESC, title
+    """
+    return query, (against, against)
+
+if __name__ == '__main__':
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        searches = fill(cursor, conn, rows)
+
+        print(f"median of {repeats} runs, ms (matching rows)")
+        print(f"{'search':<16} {'like':>16} {'boolean':>16} {'natural':>16}")
+        for name, keyword in searches.items():
+            cells = []
+            for query, params in (like(keyword),
+                                  fulltext(keyword, 'BOOLEAN MODE'),
+                                  fulltext(keyword, 'NATURAL LANGUAGE MODE')):
+                ms, count = timed(cursor, query, params, repeats)
+                cells.append(f"{ms:,.1f} ({count:,})")
+            print(f"{name:<16} {cells[0]:>16} {cells[1]:>16} {cells[2]:>16}")
+    finally:
+        conn.rollback()
+        conn.close()
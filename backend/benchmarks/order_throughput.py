@@ -0,0 +1,60 @@
+#orders per second: one query/commit per item vs one transaction per order
+#needs the configured database with at least one user and some books
+#run from backend/: python -m benchmarks.order_throughput [orders] [items per order]
+import sys
+import time
+from db import execute_query
+from models import create_order_with_items, get_books_by_ids, get_book_by_id
+from cache import cache
+
+def per_item(user_id, book_ids):
+    #the old path: a lookup per item, then an insert and commit per row
+    items = []
+    for book_id in book_ids:
+        cache.clear()
+        book = get_book_by_id(book_id)
+        items.append((book_id, float(book['price_buy'])))
+    order_id = execute_query(
+        "INSERT INTO orders (user_id, total_amount) VALUES (%s, %s)",
+        (user_id, sum(price for _, price in items)), commit=True
+    )
+    for book_id, price in items:
+        execute_query(
+            "INSERT INTO order_items (order_id, book_id, item_type, price) VALUES (%s, %s, %s, %s)",
+            (order_id, book_id, 'buy', price), commit=True
+        )
+    return order_id
+
+def batched(user_id, book_ids):
+    books = get_books_by_ids(book_ids)
+    items = [
+        {'book_id': book_id, 'type': 'buy', 'price': float(books[book_id]['price_buy'])}
+        for book_id in book_ids
+    ]
+    return create_order_with_items(user_id, sum(item['price'] for item in items), items)
+
+def measure(create, user_id, book_ids, orders):
+    created = []
+    started = time.perf_counter()
+    for _ in range(orders):
+        created.append(create(user_id, book_ids))
+    elapsed = time.perf_counter() - started
+    #order_items go with their orders (ON DELETE CASCADE)
+    placeholders = ', '.join(['%s'] * len(created))
+    execute_query(f"DELETE FROM orders WHERE id IN ({placeholders})", tuple(created), commit=True)
+    return orders / elapsed
+
+if __name__ == '__main__':
+    orders = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    per_order = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+
+    user = execute_query("SELECT id FROM users ORDER BY id LIMIT 1", fetch_one=True)
+    rows = execute_query("SELECT id FROM books ORDER BY id LIMIT %s", (per_order,), fetch_all=True)
+    if not user or not rows:
+        sys.exit("Need at least one user and one book in the database")
+    book_ids = [row['id'] for row in rows]
+    book_ids = (book_ids * per_order)[:per_order]
+
+    print(f"{orders} orders x {per_order} items")
+    print(f"per item:        {measure(per_item, user['id'], book_ids, orders):8.1f} orders/s")
+    print(f"one transaction: {measure(batched, user['id'], book_ids, orders):8.1f} orders/s")
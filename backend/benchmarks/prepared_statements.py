@@ -0,0 +1,41 @@
+#text protocol vs cached prepared statements on the hot lookups
+#needs the configured database with at least one user, book and order item
+#run from backend/: python -m benchmarks.prepared_statements [iterations]
+import sys
+import time
+from db import get_db_connection
+
+HOT_QUERIES = {
+    'get_book_by_id': ("SELECT * FROM books WHERE id = %s", "SELECT id FROM books LIMIT 1"),
+    'get_user_by_username': ("SELECT * FROM users WHERE username = %s", "SELECT username FROM users LIMIT 1"),
+    'get_order_items': ("SELECT * FROM order_items WHERE order_id = %s", "SELECT order_id FROM order_items LIMIT 1"),
+}
+
+def run(cursor, query, params, iterations):
+    started = time.perf_counter()
+    for _ in range(iterations):
+        cursor.execute(query, params)
+        cursor.fetchall()
+    return iterations / (time.perf_counter() - started)
+
+if __name__ == '__main__':
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    conn = get_db_connection()
+    try:
+        lookup = conn.cursor()
+        text = conn.cursor(dictionary=True)
+        prepared = conn.cursor(prepared=True, dictionary=True)
+
+        print(f"{'query':<22} {'text':>12} {'prepared':>12}")
+        for name, (query, sample) in HOT_QUERIES.items():
+            lookup.execute(sample)
+            row = lookup.fetchone()
+            if row is None:
+                print(f"{name:<22} skipped, no sample row")
+                continue
+            text_rate = run(text, query, row, iterations)
+            prepared_rate = run(prepared, query, row, iterations)
+            print(f"{name:<22} {text_rate:>10,.0f}/s {prepared_rate:>10,.0f}/s")
+    finally:
+        conn.rollback()
+        conn.close()
@@ -0,0 +1,40 @@
+#build time and per-prefix latency of the autocomplete index
+#runs on generated books, no database needed
+#run from backend/: python -m benchmarks.suggest_index [books]
+import random
+import statistics
+import sys
+import time
+from suggest_index import SuggestIndex
+from benchmarks.trigram_index import generate
+
+def timed(index, prefix, repeats=200):
+    #first call may fill the remembered top list, the median is the steady state
+    times = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        index.suggest(prefix)
+        times.append((time.perf_counter() - started) * 1e6)
+    return times[0], statistics.median(times)
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    books = list(generate(count))
+    rng = random.Random(7)
+    popularity = {rng.randint(1, count): rng.randint(1, 50) for _ in range(count // 10)}
+
+    index = SuggestIndex()
+    started = time.perf_counter()
+    index.build(books, popularity)
+    print(f"{count:,} books: built in {time.perf_counter() - started:.1f}s, {index.stats()['keys']:,} keys")
+
+    title = books[count // 2]['title'].lower()
+    print(f"{'prefix':<24} {'first us':>10} {'median us':>10}")
+    for prefix in (title[:1], title[:2], title[:4], title[:8], title):
+        first, median = timed(index, prefix)
+        print(f"{prefix:<24} {first:>10,.0f} {median:>10,.1f}")
+
+    started = time.perf_counter()
+    for book in books[:10000]:
+        index.upsert(book['id'], book['title'] + ' revised', book['author'], book['available'])
+    print(f"10,000 edits: {(time.perf_counter() - started) * 1000:,.0f} ms")
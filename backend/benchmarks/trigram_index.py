@@ -0,0 +1,87 @@
+#build time, memory and query latency of the trigram search index
+#runs on generated books, no database needed
+#run from backend/: python -m benchmarks.trigram_index [books]
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+from search_index import TrigramIndex
+
+SYLLABLES = ['ka', 'lo', 'mi', 'ra', 'ven', 'dor', 'sha', 'tel', 'um', 'bri',
+             'no', 'fen', 'gal', 'is', 'tor', 'wen', 'ex', 'quin', 'ly', 'zor']
+
+def make_words(count, rng):
+    words = set()
+    while len(words) < count:
+        words.add(''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))))
+    words = sorted(words)
+    rng.shuffle(words)
+    return words
+
+def generate(count):
+    #same zipf-like title words as benchmarks.fulltext_search
+    rng = random.Random(42)
+    words = make_words(5000, rng)
+    weights = [1 / rank for rank in range(1, len(words) + 1)]
+    first_names = [word.title() for word in make_words(200, rng)]
+    surnames = [word.title() for word in make_words(2000, rng)]
+    #prices have their own generator so titles and authors stay as they were
+    prices = random.Random(43)
+    for book_id in range(1, count + 1):
+        price = round(prices.uniform(5, 60), 2)
+        yield {
+            'id': book_id,
+            'title': ' '.join(rng.choices(words, weights, k=rng.randint(2, 5))).title(),
+            'author': f"{rng.choice(first_names)} {rng.choice(surnames)}",
+            'price_buy': price,
+            'price_rent': round(price / 4, 2),
+            'available': rng.random() > 0.05
+        }
+    generate.words = words
+    generate.surnames = surnames
+
+def timed(index, query, repeats=5):
+    times = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        count = len(index.search(query))
+        times.append((time.perf_counter() - started) * 1000)
+    return statistics.median(times), count
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    books = list(generate(count))
+    words = generate.words
+
+    index = TrigramIndex()
+    tracemalloc.start()
+    started = time.perf_counter()
+    index.build(books)
+    built = time.perf_counter() - started
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    stats = index.stats()
+    print(f"{count:,} books: built in {built:.1f}s (under tracemalloc), "
+          f"{memory / 2**20:,.0f} MiB, {stats['trigrams']:,} trigrams, {stats['postings']:,} postings")
+
+    typo = words[300][:2] + words[300][3] + words[300][2] + words[300][4:]
+    searches = {
+        'common word': words[0],
+        'rare word': words[3000],
+        'mid-word substring': words[100][1:-1],
+        'two words': f"{words[4]} {words[40]}",
+        'author surname': generate.surnames[7],
+        'two letters': words[0][:2],
+        'typo': typo,
+    }
+    print(f"{'search':<20} {'query':<24} {'ms':>10} {'matches':>10}")
+    for name, query in searches.items():
+        ms, matches = timed(index, query)
+        print(f"{name:<20} {query:<24} {ms:>10,.2f} {matches:>10,}")
+
+    started = time.perf_counter()
+    for book in books[:10000]:
+        index.upsert(book['id'], book['title'] + ' revised', book['author'], book['available'])
+    print(f"10,000 edits: {(time.perf_counter() - started) * 1000:,.0f} ms")
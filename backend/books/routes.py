@@ -1,58 +1,303 @@
 from flask import Blueprint, request, jsonify
-from models import get_all_books, search_books, get_book_by_id
-from cache import cache
+from decimal import Decimal
+import math
+from models import (
+    get_all_books, search_books, get_book_by_id, get_books_by_ids,
+    get_books_page, filter_books, BOOK_SORTS, BOOK_FIELDS, SEARCH_MODES
+)
+from cache import cache, book_tags
+from config import Config
+from response_cache import encode_response, send_response
+from pagination import encode_cursor, decode_cursor, parse_limit
+from projection import parse_fields, fields_key, project
+from db import PoolExhausted
+from suggest_index import suggest_index, MAX_SUGGESTIONS
+from catalogue_index import catalogue_index
 
 books_bp = Blueprint('books', __name__, url_prefix='/api/books')
 
+#any of these switches GET /api/books to the filtered form
+FILTER_ARGS = ('min_price', 'max_price', 'author', 'price', 'available')
+
+def decode_book_cursor(cursor, sort):
+    #(sort value, id) of the last book sent, raises ValueError for anything else
+    #a cursor from another sort would compare text with prices
+    after = decode_cursor(cursor, 2)
+    value, book_id = after
+    if sort == 'price':
+        if isinstance(value, Decimal):
+            valid = value.is_finite()
+        else:
+            valid = isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value)
+    else:
+        valid = isinstance(value, str)
+    if not valid or not isinstance(book_id, int) or isinstance(book_id, bool):
+        raise ValueError('Invalid cursor')
+    return after
+
+def load_books(keyword, fields=None, mode='boolean'):
+    if keyword:
+        books = search_books(keyword, fields, mode)
+    else:
+        books = get_all_books(fields)
+    
+    #encoded once here, cache hits send the stored bytes
+    return encode_response(
+        {'books': books, 'count': len(books)},
+        tags=book_tags(books, keyword)
+    )
+
+def load_books_page(keyword, sort, descending, limit, after, fields=None, mode='boolean'):
+    #one extra row tells us whether there is a next page
+    books = get_books_page(limit + 1, sort, descending, after, keyword, fields, mode)
+    next_cursor = None
+    if len(books) > limit:
+        books = books[:limit]
+        last = books[-1]
+        next_cursor = encode_cursor(last[BOOK_SORTS[sort]], last['id'])
+    
+    #drop the sort column again if it wasn't asked for
+    books = [project(book, fields) for book in books]
+    return encode_response(
+        {'books': books, 'count': len(books), 'next_cursor': next_cursor},
+        tags=book_tags(books, keyword)
+    )
+
 @books_bp.route('', methods=['GET'])
 def get_books():
+    if 'ids' in request.args:
+        return get_books_batch(request.args['ids'])
+    
     keyword = request.args.get('q', '').strip()
+    #mode=boolean (every word, as a prefix) or natural (any word, best matches first)
+    mode = request.args.get('mode', Config.SEARCH_MODE)
+    if mode not in SEARCH_MODES:
+        return jsonify({'error': f'mode must be one of: {", ".join(SEARCH_MODES)}'}), 400
     
     try:
-        #check cache first
-        cache_key = f"books:{keyword}"
-        cached_books = cache.get(cache_key)
+        fields = parse_fields(request.args.get('fields'), BOOK_FIELDS)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    if any(arg in request.args for arg in FILTER_ARGS):
+        return get_books_filtered(keyword, fields)
+    
+    paged = any(arg in request.args for arg in ('limit', 'cursor', 'sort', 'order'))
+    
+    if paged:
+        #paged form: limit, cursor, sort=title|author|price, order=asc|desc
+        sort = request.args.get('sort', 'title')
+        order = request.args.get('order', 'asc')
+        if sort not in BOOK_SORTS:
+            return jsonify({'error': f'sort must be one of: {", ".join(BOOK_SORTS)}'}), 400
+        if order not in ('asc', 'desc'):
+            return jsonify({'error': 'order must be asc or desc'}), 400
         
-        if cached_books is not None:
-            return jsonify({
-                'books': cached_books,
-                'count': len(cached_books),
-                'cached': True
-            }), 200
+        try:
+            limit = parse_limit(request.args.get('limit'))
+            cursor = request.args.get('cursor', '')
+            after = decode_book_cursor(cursor, sort) if cursor else None
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        #re-encoded so the cache key only ever holds cursors we issued
+        cursor = encode_cursor(*after) if after else ''
+    
+    try:
+        #concurrent misses share one query and stale results are
+        #served while a background refresh runs
+        loaded = []
         
-        #get from db
-        if keyword:
-            books = search_books(keyword)
+        if paged:
+            #every page and projection is cached on its own, carrying the same tags as the full list
+            cache_key = f"books:page:{fields_key(fields)}:{mode}:{sort}:{order}:{limit}:{cursor}:{keyword}"
+            
+            def load():
+                loaded.append(True)
+                return load_books_page(keyword, sort, order == 'desc', limit, after, fields, mode)
         else:
-            books = get_all_books()
+            cache_key = f"books:all:{fields_key(fields)}:{mode}:{keyword}"
+            
+            def load():
+                loaded.append(True)
+                return load_books(keyword, fields, mode)
         
-        #convert decimal to float
-        for book in books:
-            book['price_buy'] = float(book['price_buy'])
-            book['price_rent'] = float(book['price_rent'])
+        response = cache.get_or_load(
+            cache_key,
+            load,
+            ttl_seconds=Config.BOOKS_CACHE_TTL,
+            tags=lambda response: response.tags,
+            stale_seconds=Config.BOOKS_CACHE_STALE_SECONDS
+        )
         
-        cache.set(cache_key, books, ttl_seconds=30)
+        return send_response(response, hit=not loaded)
+        
+    except PoolExhausted:
+        raise
+    except Exception as e:
+        return jsonify({'error': f'Failed to retrieve books: {str(e)}'}), 500
+
+def load_books_filtered(keyword, filters, sort, descending, limit, after, fields=None):
+    books, last, total = filter_books(
+        limit, filters['price'], filters['min_price'], filters['max_price'], filters['author'],
+        filters['available'], keyword, sort, descending, after, fields
+    )
+    for book in books:
+        for price in ('price_buy', 'price_rent'):
+            if price in book:
+                book[price] = float(book[price])
+    
+    #any edit can move a book into or out of a price range, so every filtered
+    #page is dropped with the full list
+    tags = book_tags(books, keyword) | {'books:list'}
+    return encode_response(
+        {'books': books, 'count': len(books), 'total': total,
+         'next_cursor': encode_cursor(*last) if last else None},
+        tags=tags
+    )
+
+def get_books_filtered(keyword, fields):
+    #GET /api/books?min_price=5&max_price=20&price=buy|rent&author=...&available=true|false|any
+    #plus q, sort=title|author|price, order, limit and cursor, answered from the catalogue index
+    if not catalogue_index.ready:
+        #the resource exists, this server just doesn't offer the feature
+        return jsonify({'error': 'Filtering is not enabled'}), 501
+    
+    filters = {'price': request.args.get('price', 'buy'), 'author': request.args.get('author', '').strip() or None}
+    if filters['price'] not in ('buy', 'rent'):
+        return jsonify({'error': 'price must be buy or rent'}), 400
+    
+    try:
+        for bound in ('min_price', 'max_price'):
+            value = request.args.get(bound)
+            filters[bound] = float(value) if value else None
+            #nan and inf would slip past the price bisects and fill the cache with keys
+            if filters[bound] is not None and not math.isfinite(filters[bound]):
+                raise ValueError(bound)
+    except ValueError:
+        return jsonify({'error': 'min_price and max_price must be numbers'}), 400
+    
+    available = request.args.get('available', 'true').lower()
+    if available not in ('true', 'false', 'any'):
+        return jsonify({'error': 'available must be true, false or any'}), 400
+    filters['available'] = None if available == 'any' else available == 'true'
+    
+    sort = request.args.get('sort', 'title')
+    order = request.args.get('order', 'asc')
+    if sort not in BOOK_SORTS:
+        return jsonify({'error': f'sort must be one of: {", ".join(BOOK_SORTS)}'}), 400
+    if order not in ('asc', 'desc'):
+        return jsonify({'error': 'order must be asc or desc'}), 400
+    
+    try:
+        limit = parse_limit(request.args.get('limit'))
+        cursor = request.args.get('cursor', '')
+        after = decode_book_cursor(cursor, sort) if cursor else None
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    cursor = encode_cursor(*after) if after else ''
+    
+    try:
+        loaded = []
+        cache_key = (f"books:filter:{fields_key(fields)}:{filters['price']}:{filters['min_price']}:"
+                     f"{filters['max_price']}:{available}:{sort}:{order}:{limit}:{cursor}:"
+                     f"{filters['author']!r}:{keyword}")
+        
+        def load():
+            loaded.append(True)
+            return load_books_filtered(keyword, filters, sort, order == 'desc', limit, after, fields)
+        
+        response = cache.get_or_load(
+            cache_key,
+            load,
+            ttl_seconds=Config.BOOKS_CACHE_TTL,
+            tags=lambda response: response.tags,
+            stale_seconds=Config.BOOKS_CACHE_STALE_SECONDS
+        )
+        
+        return send_response(response, hit=not loaded)
+        
+    except PoolExhausted:
+        raise
+    except Exception as e:
+        return jsonify({'error': f'Failed to retrieve books: {str(e)}'}), 500
+
+def get_books_batch(ids):
+    #GET /api/books?ids=1,2,3 returns those books in the order asked, unknown ids are left out
+    try:
+        book_ids = [int(book_id) for book_id in ids.split(',') if book_id.strip()]
+    except ValueError:
+        return jsonify({'error': 'ids must be a comma separated list of book IDs'}), 400
+    
+    if not book_ids:
+        return jsonify({'error': 'No book IDs provided'}), 400
+    
+    try:
+        found = get_books_by_ids(book_ids)
+        
+        books = []
+        for book_id in dict.fromkeys(book_ids):
+            book = found.get(book_id)
+            if book:
+                book['price_buy'] = float(book['price_buy'])
+                book['price_rent'] = float(book['price_rent'])
+                books.append(book)
         
         return jsonify({
             'books': books,
             'count': len(books)
         }), 200
         
+    except PoolExhausted:
+        raise
     except Exception as e:
         return jsonify({'error': f'Failed to retrieve books: {str(e)}'}), 500
 
+@books_bp.route('/suggest', methods=['GET'])
+def suggest_books():
+    #GET /api/books/suggest?prefix=du&limit=10, titles and authors starting with prefix,
+    #most ordered first, answered from memory
+    prefix = request.args.get('prefix', '').strip()
+    if not prefix:
+        return jsonify({'error': 'prefix is required'}), 400
+    
+    try:
+        limit = int(request.args.get('limit', 10))
+    except ValueError:
+        limit = 0
+    if limit < 1 or limit > MAX_SUGGESTIONS:
+        return jsonify({'error': f'limit must be between 1 and {MAX_SUGGESTIONS}'}), 400
+    
+    if not suggest_index.ready:
+        return jsonify({'error': 'Suggestions are not enabled'}), 404
+    
+    suggestions = suggest_index.suggest(prefix, limit)
+    return jsonify({
+        'suggestions': suggestions,
+        'count': len(suggestions)
+    }), 200
+
 @books_bp.route('/<int:book_id>', methods=['GET'])
 def get_book(book_id):
     try:
+        fields = parse_fields(request.args.get('fields'), BOOK_FIELDS)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    try:
+        #the whole row is already cached under book:<id>, a projection is just a slice of it
         book = get_book_by_id(book_id)
         
         if not book:
             return jsonify({'error': 'Book not found'}), 404
         
-        book['price_buy'] = float(book['price_buy'])
-        book['price_rent'] = float(book['price_rent'])
+        book = project(book, fields)
+        for price in ('price_buy', 'price_rent'):
+            if price in book:
+                book[price] = float(book[price])
         
         return jsonify(book), 200
         
+    except PoolExhausted:
+        raise
     except Exception as e:
         return jsonify({'error': f'Failed to retrieve book: {str(e)}'}), 500
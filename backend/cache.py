@@ -1,35 +1,579 @@
-from datetime import datetime, timedelta
-from threading import Lock
+import sys
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from threading import Event, Lock
+from config import Config
+
+def _estimate_size(value, _depth=0):
+    #rough byte size of a cached value (good enough for budgeting)
+    size = sys.getsizeof(value)
+    if _depth > 3:
+        return size
+    if isinstance(value, dict):
+        for k, v in value.items():
+            size += _estimate_size(k, _depth + 1) + _estimate_size(v, _depth + 1)
+    elif isinstance(value, (list, tuple, set)):
+        for item in value:
+            size += _estimate_size(item, _depth + 1)
+    return size
+
+class _Flight:
+    #one in-progress load that other callers can wait on
+
+    def __init__(self):
+        self.done = Event()
+        self.value = None
+        self.error = None
+
+def namespace(key):
+    #"books:dune" -> "books:", stats are kept per namespace
+    prefix, sep, rest = key.partition(':')
+    return prefix + sep
+
+METRIC_FIELDS = ('hits', 'stale_hits', 'misses', 'loads', 'load_errors', 'load_seconds',
+                 'expirations', 'evictions')
+
+def _count(namespaces, key, field, amount=1):
+    #adds to {namespace: counters}, the caller holds whatever lock guards it
+    ns = namespace(key)
+    counters = namespaces.get(ns)
+    if counters is None:
+        counters = namespaces[ns] = dict.fromkeys(METRIC_FIELDS, 0)
+    counters[field] += amount
+
+def _merge(into, namespaces):
+    for ns, counters in namespaces.items():
+        total = into.setdefault(ns, dict.fromkeys(METRIC_FIELDS, 0))
+        for field, amount in counters.items():
+            total[field] += amount
+
+class CacheMetrics:
+    #counters per key namespace
+
+    FIELDS = METRIC_FIELDS
 
-class SimpleCache:
-    
     def __init__(self):
-        self._cache = {}
         self._lock = Lock()
-    
-    def get(self, key):
-        #get from cache if still valid
+        self._counters = {}
+
+    def record(self, key, field, amount=1):
         with self._lock:
-            if key in self._cache:
-                value, expiry = self._cache[key]
-                if datetime.now() < expiry:
-                    return value
-                else:
-                    del self._cache[key]
-            return None
-    
-    def set(self, key, value, ttl_seconds=60):
+            _count(self._counters, key, field, amount)
+
+    def snapshot(self):
         with self._lock:
-            expiry = datetime.now() + timedelta(seconds=ttl_seconds)
-            self._cache[key] = (value, expiry)
-    
+            return {ns: dict(counters) for ns, counters in self._counters.items()}
+
+class _ShardMetrics:
+    #CacheMetrics for a SimpleCache, every stripe keeps the counters of its own keys
+    #so counting never needs a lock of its own, snapshot adds them up
+
+    FIELDS = METRIC_FIELDS
+
+    def __init__(self, cache):
+        self._cache = cache
+
+    def record(self, key, field, amount=1):
+        shard = self._cache._shard(key)
+        with shard.lock:
+            shard.record(key, field, amount)
+
+    def snapshot(self):
+        namespaces = {}
+        for shard in self._cache._shards:
+            with shard.lock:
+                _merge(namespaces, shard.counters)
+        return namespaces
+
+class BaseCache:
+    #shared get_or_load logic, backends implement the storage side:
+    #_peek, set, get_many, delete, invalidate_tags, tags_with_prefix, clear, stats
+    #_peek also counts the lookup, see _lookup_field
+
+    def __init__(self, load_timeout=5, refresh_workers=2):
+        self.load_timeout = load_timeout
+        self.refresh_workers = refresh_workers
+        self._loading = {}
+        self._flight_lock = Lock()
+        self._refresher = None
+        self._generation = 0
+        self.metrics = CacheMetrics()
+
+    def get(self, key):
+        #get from cache if still valid
+        value, fresh = self._peek(key, stale_hit=False)
+        return value if fresh else None
+
+    def get_or_load(self, key, loader, ttl_seconds=60, tags=(), timeout=None, stale_seconds=0):
+        #on a miss only one caller per key runs loader, the others wait for it
+        #a stale entry is returned right away and refreshed in the background
+        #ttl_seconds and tags can be callables that get the loaded value
+        value, fresh = self._peek(key)
+        if fresh:
+            return value
+        with self._flight_lock:
+            flight = self._loading.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._loading[key] = _Flight()
+
+        args = (key, flight, loader, ttl_seconds, tags, stale_seconds)
+        if value is not None:
+            if leader:
+                self._refresh_pool().submit(self._load, *args)
+            return value
+
+        if not leader:
+            if not flight.done.wait(timeout or self.load_timeout):
+                #the loader looks stuck, don't queue behind it
+                return loader()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        return self._load(*args)
+
+    def _load(self, key, flight, loader, ttl_seconds, tags, stale_seconds):
+        generation = self._current_generation()
+        started = time.perf_counter()
+        try:
+            value = loader()
+            self.metrics.record(key, 'loads')
+            if value is not None:
+                if callable(ttl_seconds):
+                    ttl_seconds = ttl_seconds(value)
+                if callable(tags):
+                    tags = tags(value)
+                #an invalidation during the load means value may already be outdated
+                self._set_if_current(generation, key, value, ttl_seconds, tags, stale_seconds)
+            flight.value = value
+            return value
+        except Exception as e:
+            self.metrics.record(key, 'load_errors')
+            flight.error = e
+            raise
+        finally:
+            self.metrics.record(key, 'load_seconds', time.perf_counter() - started)
+            with self._flight_lock:
+                del self._loading[key]
+            flight.done.set()
+
+    def _namespace_stats(self, entries=None):
+        #counters per namespace, plus current entry counts when the backend knows them
+        namespaces = self.metrics.snapshot()
+        for ns, count in (entries or {}).items():
+            namespaces.setdefault(ns, dict.fromkeys(METRIC_FIELDS, 0))
+        for ns, counters in namespaces.items():
+            if entries is not None:
+                counters['entries'] = entries.get(ns, 0)
+            lookups = counters['hits'] + counters['stale_hits'] + counters['misses']
+            counters['hit_ratio'] = round((counters['hits'] + counters['stale_hits']) / lookups, 4) if lookups else None
+            counters['load_seconds'] = round(counters['load_seconds'], 6)
+        return namespaces
+
+    @staticmethod
+    def _lookup_field(value, fresh, stale_hit=True):
+        #counter a lookup goes to, get() can't use a stale value so it counts as a miss
+        if fresh:
+            return 'hits'
+        return 'stale_hits' if value is not None and stale_hit else 'misses'
+
+    def _count_many(self, keys, found):
+        for key in keys:
+            self.metrics.record(key, 'hits' if key in found else 'misses')
+
+    def _invalidated(self):
+        #backends call this whenever entries are dropped on purpose
+        with self._flight_lock:
+            self._generation += 1
+
+    def _current_generation(self):
+        #read before a load, a shared backend keeps it where every worker sees it
+        with self._flight_lock:
+            return self._generation
+
+    def _set_if_current(self, generation, key, value, ttl_seconds, tags, stale_seconds):
+        #set, unless anything was invalidated since generation was read
+        with self._flight_lock:
+            if generation != self._generation:
+                return False
+        self.set(key, value, ttl_seconds, tags, stale_seconds)
+        return True
+
+    def _refresh_pool(self):
+        with self._flight_lock:
+            if self._refresher is None:
+                self._refresher = ThreadPoolExecutor(
+                    max_workers=self.refresh_workers,
+                    thread_name_prefix='cache-refresh'
+                )
+            return self._refresher
+
+class _Budget:
+    #entry and byte totals of a whole SimpleCache, shared by its stripes
+    #stripes update it while holding their own lock, never the other way round
+
+    def __init__(self, max_entries, max_bytes):
+        self.lock = Lock()
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = 0
+        self.bytes = 0
+
+    def change(self, entries, size):
+        with self.lock:
+            self.entries += entries
+            self.bytes += size
+
+    def over(self):
+        with self.lock:
+            return ((self.max_entries and self.entries > self.max_entries) or
+                    (self.max_bytes and self.bytes > self.max_bytes))
+
+class _Shard:
+    #one stripe of a SimpleCache with its own lock, LRU order and tag index
+
+    def __init__(self, budget, sweep_interval):
+        #entries are key -> (value, expiry, stale_until, size, tags), oldest used first
+        self.cache = OrderedDict()
+        self.tags = {}
+        self.lock = Lock()
+        self.budget = budget
+        self.sweep_interval = sweep_interval
+        self.next_sweep = time.monotonic() + sweep_interval
+        self.bytes = 0
+        #{namespace: counters} for the keys in this stripe, see _ShardMetrics
+        self.counters = {}
+        self.namespaces = {}
+
+    #helpers below expect the lock to be held
+    def record(self, key, field, amount=1):
+        _count(self.counters, key, field, amount)
+
+    def lookup(self, key, now):
+        #returns (value, fresh), value is None once the entry is gone for good
+        entry = self.cache.get(key)
+        if entry is not None:
+            if now < entry[2]:
+                self.cache.move_to_end(key)
+                return entry[0], now < entry[1]
+            self.remove(key)
+            self.record(key, 'expirations')
+        return None, False
+
+    def insert(self, key, value, expiry, stale_until, size, tags, now):
+        if key in self.cache:
+            self.remove(key)
+        self.cache[key] = (value, expiry, stale_until, size, tags)
+        self.bytes += size
+        if self.budget is not None:
+            self.budget.change(1, size)
+        ns = namespace(key)
+        self.namespaces[ns] = self.namespaces.get(ns, 0) + 1
+        for tag in tags:
+            self.tags.setdefault(tag, set()).add(key)
+
+        if now >= self.next_sweep:
+            self.sweep(now)
+
+    def remove(self, key):
+        value, expiry, stale_until, size, tags = self.cache.pop(key)
+        self.bytes -= size
+        if self.budget is not None:
+            self.budget.change(-1, -size)
+        ns = namespace(key)
+        self.namespaces[ns] -= 1
+        if not self.namespaces[ns]:
+            del self.namespaces[ns]
+        for tag in tags:
+            keys = self.tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.tags[tag]
+
+    def sweep(self, now):
+        #drop everything that expired since the last sweep
+        expired = [k for k, entry in self.cache.items() if entry[2] <= now]
+        for key in expired:
+            self.remove(key)
+            self.record(key, 'expirations')
+        self.next_sweep = now + self.sweep_interval
+
+    def evict_oldest(self, keep=0):
+        #drops the least recently used entry unless only keep are left, False if none was
+        if len(self.cache) <= keep:
+            return False
+        key = next(iter(self.cache))
+        self.remove(key)
+        self.record(key, 'evictions')
+        return True
+
+    def clear(self):
+        if self.budget is not None:
+            self.budget.change(-len(self.cache), -self.bytes)
+        self.cache.clear()
+        self.tags.clear()
+        self.namespaces.clear()
+        self.bytes = 0
+
+class SimpleCache(BaseCache):
+    #in-process cache, one per worker
+    #keys are spread over stripes so threads rarely wait on the same lock,
+    #size limits hold for the cache as a whole
+
+    def __init__(self, max_entries=None, max_bytes=None, sweep_interval=60, load_timeout=5,
+                 refresh_workers=2, stripes=16):
+        super().__init__(load_timeout, refresh_workers)
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        budget = _Budget(max_entries, max_bytes) if max_entries or max_bytes else None
+        self._budget = budget
+        self._shards = [_Shard(budget, sweep_interval) for _ in range(stripes)]
+        self.metrics = _ShardMetrics(self)
+
+    def set(self, key, value, ttl_seconds=60, tags=(), stale_seconds=0):
+        #tags name what the value depends on, see invalidate_tags
+        #stale_seconds keeps the entry around after ttl for get_or_load to serve
+        size = _estimate_size(value)
+        tags = frozenset(tags)
+        now = time.monotonic()
+        expiry = now + ttl_seconds
+        shard = self._shard(key)
+        with shard.lock:
+            if self.max_bytes and size > self.max_bytes:
+                #would push out everything else and still not fit, don't keep it
+                #(nor the value it was meant to replace)
+                if key in shard.cache:
+                    shard.remove(key)
+                return
+            shard.insert(key, value, expiry, expiry + stale_seconds, size, tags, now)
+        if self._budget is not None and self._budget.over():
+            self._evict(shard)
+
+    def _evict(self, first):
+        #least recently used entries of the stripe that took the new entry go
+        #first (keeping the new one), then the oldest of the other stripes
+        #only one stripe lock is held at a time
+        for shard in [first] + [other for other in self._shards if other is not first]:
+            keep = 1 if shard is first else 0
+            while self._budget.over():
+                with shard.lock:
+                    if not shard.evict_oldest(keep):
+                        break
+            if not self._budget.over():
+                return
+
+    def get_many(self, keys):
+        #fresh values only, missing keys are left out
+        found = {}
+        now = time.monotonic()
+        for key in keys:
+            shard = self._shard(key)
+            with shard.lock:
+                value, fresh = shard.lookup(key, now)
+                shard.record(key, 'hits' if fresh else 'misses')
+            if fresh:
+                found[key] = value
+        return found
+
     def delete(self, key):
-        with self._lock:
-            if key in self._cache:
-                del self._cache[key]
-    
+        self._invalidated()
+        shard = self._shard(key)
+        with shard.lock:
+            if key in shard.cache:
+                shard.remove(key)
+
+    def invalidate_tags(self, *tags):
+        #drops every entry carrying any of the tags
+        self._invalidated()
+        count = 0
+        for shard in self._shards:
+            with shard.lock:
+                keys = set()
+                for tag in tags:
+                    keys.update(shard.tags.get(tag, ()))
+                for key in keys:
+                    shard.remove(key)
+                count += len(keys)
+        return count
+
+    def tags_with_prefix(self, prefix):
+        found = set()
+        for shard in self._shards:
+            with shard.lock:
+                found.update(tag for tag in shard.tags if tag.startswith(prefix))
+        return list(found)
+
     def clear(self):
-        with self._lock:
-            self._cache.clear()
+        self._invalidated()
+        for shard in self._shards:
+            with shard.lock:
+                shard.clear()
+
+    def stats(self):
+        stats = {
+            'backend': 'memory',
+            'entries': 0,
+            'bytes': 0,
+            'max_entries': self.max_entries,
+            'max_bytes': self.max_bytes,
+            'stripes': len(self._shards)
+        }
+        entries = {}
+        for shard in self._shards:
+            with shard.lock:
+                stats['entries'] += len(shard.cache)
+                stats['bytes'] += shard.bytes
+                for ns, count in shard.namespaces.items():
+                    entries[ns] = entries.get(ns, 0) + count
+        stats['namespaces'] = self._namespace_stats(entries)
+        for field in ('evictions', 'expirations'):
+            stats[field] = sum(counters[field] for counters in stats['namespaces'].values())
+        return stats
+
+    def _shard(self, key):
+        return self._shards[hash(key) % len(self._shards)]
+
+    def _peek(self, key, stale_hit=True):
+        shard = self._shard(key)
+        now = time.monotonic()
+        with shard.lock:
+            value, fresh = shard.lookup(key, now)
+            shard.record(key, self._lookup_field(value, fresh, stale_hit))
+            return value, fresh
+
+class TieredCache(BaseCache):
+    #small per-process L1 in front of a shared L2 (RedisCache)
+    #l1_ttl bounds how long a worker can miss another worker's write
+
+    def __init__(self, l1, l2, l1_ttl=5, load_timeout=5, refresh_workers=2):
+        super().__init__(load_timeout, refresh_workers)
+        self.l1 = l1
+        self.l2 = l2
+        self.l1_ttl = l1_ttl
+
+    def set(self, key, value, ttl_seconds=60, tags=(), stale_seconds=0):
+        tags = frozenset(tags)
+        self.l2.set(key, value, ttl_seconds, tags, stale_seconds)
+        self.l1.set(key, value, min(ttl_seconds, self.l1_ttl), tags)
+
+    def _current_generation(self):
+        return self.l2._current_generation()
+
+    def _set_if_current(self, generation, key, value, ttl_seconds, tags, stale_seconds):
+        #the shared tier decides, other workers' invalidations only show up there
+        tags = frozenset(tags)
+        if not self.l2._set_if_current(generation, key, value, ttl_seconds, tags, stale_seconds):
+            return False
+        self.l1.set(key, value, min(ttl_seconds, self.l1_ttl), tags)
+        return True
+
+    def get_many(self, keys):
+        found = self.l1.get_many(keys)
+        missing = [key for key in keys if key not in found]
+        if missing:
+            found.update(self.l2.get_many(missing))
+        self._count_many(keys, found)
+        return found
+
+    def delete(self, key):
+        self._invalidated()
+        self.l2.delete(key)
+        self.l1.delete(key)
+
+    def invalidate_tags(self, *tags):
+        self._invalidated()
+        count = self.l2.invalidate_tags(*tags)
+        self.l1.invalidate_tags(*tags)
+        return count
+
+    def tags_with_prefix(self, prefix):
+        return sorted(set(self.l2.tags_with_prefix(prefix)) | set(self.l1.tags_with_prefix(prefix)))
+
+    def clear(self):
+        self._invalidated()
+        self.l2.clear()
+        self.l1.clear()
+
+    def stats(self):
+        return {
+            'backend': 'tiered',
+            'namespaces': self._namespace_stats(),
+            'l1': self.l1.stats(),
+            'l2': self.l2.stats()
+        }
+
+    def _peek(self, key, stale_hit=True):
+        value = self.l1.get(key)
+        if value is not None:
+            self.metrics.record(key, 'hits')
+            return value, True
+        value, fresh, tags = self.l2.peek_tagged(key)
+        if fresh:
+            self.l1.set(key, value, self.l1_ttl, tags)
+        self.metrics.record(key, self._lookup_field(value, fresh, stale_hit))
+        return value, fresh
+
+def create_cache():
+    #CACHE_BACKEND picks memory (per worker), redis (shared) or tiered (both)
+    options = {
+        'load_timeout': Config.CACHE_LOAD_TIMEOUT,
+        'refresh_workers': Config.CACHE_REFRESH_WORKERS
+    }
+    if Config.CACHE_BACKEND not in ('memory', 'redis', 'tiered'):
+        raise ValueError(f'Unknown CACHE_BACKEND: {Config.CACHE_BACKEND}')
+
+    if Config.CACHE_BACKEND == 'memory':
+        return SimpleCache(
+            max_entries=Config.CACHE_MAX_ENTRIES,
+            max_bytes=Config.CACHE_MAX_BYTES,
+            sweep_interval=Config.CACHE_SWEEP_SECONDS,
+            stripes=Config.CACHE_STRIPES,
+            **options
+        )
+
+    #redis is only needed when a shared backend is configured
+    from redis_cache import RedisCache
+    shared = RedisCache.from_url(Config.REDIS_URL, **options)
+    if Config.CACHE_BACKEND == 'redis':
+        return shared
+
+    local = SimpleCache(
+        max_entries=Config.CACHE_L1_MAX_ENTRIES,
+        max_bytes=Config.CACHE_MAX_BYTES,
+        sweep_interval=Config.CACHE_SWEEP_SECONDS,
+        stripes=Config.CACHE_STRIPES
+    )
+    return TieredCache(local, shared, l1_ttl=Config.CACHE_L1_TTL, **options)
+
+cache = create_cache()
+
+#book tags: "book:<id>" for entries containing a book, "books:list" for the
+#full listing and "term:<word>" for each word of a search
+def search_words(keyword):
+    #split the way the FULLTEXT parser does, on anything that isn't a letter or digit
+    words = ''.join(ch if ch.isalnum() else ' ' for ch in keyword.lower()).split()
+    return words or [keyword.lower()]
+
+def book_tags(books, keyword=''):
+    #every edit drops books:list, so unfiltered lists need no per-book tags
+    #searches carry their books (an edit can make one stop matching) and their words,
+    #full text matches words in any order, so a book can start matching
+    #"dune herbert" without containing that phrase, any of its words will do
+    if not keyword:
+        return {'books:list'}
+    tags = {f"book:{book['id']}" for book in books}
+    tags.update(f"term:{word}" for word in search_words(keyword))
+    return tags
 
-cache = SimpleCache()
+def invalidate_book(book_id, *texts):
+    #evicts entries holding the book plus searches its new title/author could match
+    texts = [text.lower() for text in texts]
+    tags = [f"book:{book_id}", 'books:list']
+    for tag in cache.tags_with_prefix('term:'):
+        term = tag[len('term:'):]
+        if any(term in text for text in texts):
+            tags.append(tag)
+    return cache.invalidate_tags(*tags)
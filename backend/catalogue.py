@@ -0,0 +1,147 @@
+from bisect import bisect_left, bisect_right, insort
+import threading
+from config import Config
+
+#the whole books table held in memory per worker (CATALOGUE_SNAPSHOT), so book
+#reads keep working when every pooled connection is busy with orders
+#rows are tuples in column order, the available books are also kept sorted
+#by each paging column as (key, id) pairs
+
+def sort_key(value):
+    #text compares case-insensitively like the table's collation, prices as they are
+    return value.casefold() if isinstance(value, str) else value
+
+class CatalogueSnapshot:
+
+    def __init__(self, sort_columns):
+        self._lock = threading.Lock()
+        self.ready = False
+        self._sort_columns = tuple(sort_columns)
+        self._clear()
+
+    def _clear(self):
+        self._names = ()
+        self._positions = {}
+        #book id -> row tuple
+        self._rows = {}
+        #column -> sorted [(key, id)] of available books
+        self._orders = {column: [] for column in self._sort_columns}
+        #newest updated_at seen, reconciling asks for anything from then on
+        self.updated_at = None
+
+    def load(self, loader, catch_up=None):
+        #loader() returns every books row, always read fresh so there is nothing
+        #for catch_up (see CatalogueFile.load) to do
+        self.build(loader())
+
+    def build(self, rows):
+        #rows are full books rows (SELECT *)
+        with self._lock:
+            self._clear()
+            for row in rows:
+                if not self._names:
+                    self._names = tuple(row)
+                    self._positions = {name: position for position, name in enumerate(self._names)}
+                self._store(row)
+            for column, order in self._orders.items():
+                position = self._positions.get(column)
+                if position is not None:
+                    order.extend((sort_key(values[position]), book_id)
+                                 for book_id, values in self._rows.items() if self._available(values))
+                    order.sort()
+            self.ready = True
+
+    def upsert(self, row):
+        with self._lock:
+            if not self._names:
+                self._names = tuple(row)
+                self._positions = {name: position for position, name in enumerate(self._names)}
+            self._remove(row['id'])
+            values = self._store(row)
+            if self._available(values):
+                for column, order in self._orders.items():
+                    insort(order, (sort_key(values[self._positions[column]]), row['id']))
+
+    def remove(self, book_id):
+        with self._lock:
+            self._remove(book_id)
+
+    def _store(self, row):
+        values = tuple(row[name] for name in self._names)
+        self._rows[row['id']] = values
+        updated_at = row.get('updated_at')
+        if updated_at is not None and (self.updated_at is None or updated_at > self.updated_at):
+            self.updated_at = updated_at
+        return values
+
+    def _available(self, values):
+        return bool(values[self._positions['available']])
+
+    def _remove(self, book_id):
+        values = self._rows.pop(book_id, None)
+        if values is None or not self._available(values):
+            return
+        for column, order in self._orders.items():
+            entry = (sort_key(values[self._positions[column]]), book_id)
+            del order[bisect_left(order, entry)]
+
+    def _row(self, values):
+        return dict(zip(self._names, values))
+
+    def get(self, book_id):
+        with self._lock:
+            values = self._rows.get(book_id)
+            return self._row(values) if values is not None else None
+
+    def get_many(self, book_ids):
+        #{id: book} for the ids that exist
+        with self._lock:
+            rows = self._rows
+            return {book_id: self._row(rows[book_id]) for book_id in set(book_ids) if book_id in rows}
+
+    def ids(self):
+        with self._lock:
+            return set(self._rows)
+
+    def page(self, column, limit=None, descending=False, after=None, match=None):
+        #available books ordered by column then id, like get_books_page
+        #after is the (value, id) of the last book on the previous page, match
+        #is an optional test on the row dict, limit=None returns them all
+        with self._lock:
+            order = self._orders[column]
+            rows = self._rows
+            if descending:
+                end = len(order) if after is None else bisect_left(order, (sort_key(after[0]), after[1]))
+                entries = (order[position] for position in range(end - 1, -1, -1))
+            else:
+                start = 0 if after is None else bisect_right(order, (sort_key(after[0]), after[1]))
+                entries = (order[position] for position in range(start, len(order)))
+
+            books = []
+            for key, book_id in entries:
+                book = self._row(rows[book_id])
+                if match is None or match(book):
+                    books.append(book)
+                    if limit is not None and len(books) == limit:
+                        break
+            return books
+
+    def stats(self):
+        with self._lock:
+            return {
+                'books': len(self._rows),
+                'available': len(next(iter(self._orders.values()), ()))
+            }
+
+def create_catalogue():
+    #CATALOGUE_STORE picks memory (a copy per worker) or file (one mapped file
+    #shared by every worker on the host)
+    if Config.CATALOGUE_STORE == 'memory':
+        #title, author and price_buy are the columns GET /api/books pages by
+        return CatalogueSnapshot(('title', 'author', 'price_buy'))
+    if Config.CATALOGUE_STORE == 'file':
+        from catalogue_file import CatalogueFile
+        return CatalogueFile(Config.CATALOGUE_FILE)
+    raise ValueError(f'Unknown CATALOGUE_STORE: {Config.CATALOGUE_STORE}')
+
+catalogue = create_catalogue()
@@ -0,0 +1,403 @@
+from array import array
+from bisect import bisect_left
+from datetime import datetime, timedelta
+from decimal import Decimal
+import heapq
+import mmap
+import os
+import struct
+import threading
+import time
+
+#the books table as one binary file (CATALOGUE_STORE=file), mapped read-only by
+#every worker so they all share a single copy through the page cache
+#
+#layout, every section starts on an 8 byte boundary, numbers in host byte order:
+#  header    magic, books, available books, newest updated_at, heap size
+#  columns   one array per column with a slot per book, books in id order
+#            id (the id index, looked up by bisect), title and author as
+#            offset/length into the heap, prices in cents, available,
+#            created_at and updated_at in microseconds since 1970
+#  orders    slot numbers of the available books sorted by title, author and
+#            price_buy (then id), for the paged and full book lists
+#  heap      titles and authors, utf-8
+#
+#a rebuild writes a new file next to the old one and renames it over the top,
+#mapped readers keep the old copy until they reopen
+
+MAGIC = b'BOOKCAT1'
+HEADER = struct.Struct('=8sIIqQ')
+#created_at/updated_at of NULL
+NO_TIME = -2 ** 63
+EPOCH = datetime(1970, 1, 1)
+#wait before trying a failed rebuild again
+RETRY_SECONDS = 5
+MISSING = object()
+
+#(name, typecode) in file order
+COLUMNS = (
+    ('id', 'I'),
+    ('title_offset', 'I'), ('title_length', 'H'),
+    ('author_offset', 'I'), ('author_length', 'H'),
+    ('price_buy', 'q'), ('price_rent', 'q'),
+    ('available', 'B'),
+    ('created_at', 'q'), ('updated_at', 'q'),
+)
+ORDERS = ('title', 'author', 'price_buy')
+#the books columns a row comes back with
+FIELDS = ('id', 'title', 'author', 'price_buy', 'price_rent', 'available', 'created_at', 'updated_at')
+
+def _to_micros(value):
+    if value is None:
+        return NO_TIME
+    return (value - EPOCH) // timedelta(microseconds=1)
+
+def _from_micros(value):
+    return None if value == NO_TIME else EPOCH + timedelta(0, 0, value)
+
+def _cents(value):
+    return int((Decimal(value) * 100).to_integral_value())
+
+def _padding(size):
+    return b'\0' * (-size % 8)
+
+def write_snapshot(path, rows):
+    #writes rows (full books rows) to path, replacing any snapshot there in one step
+    books = sorted((row['id'], row) for row in rows)
+    columns = {name: array(code) for name, code in COLUMNS}
+    heap = bytearray()
+    newest = NO_TIME
+    for book_id, row in books:
+        columns['id'].append(book_id)
+        for text in ('title', 'author'):
+            encoded = row[text].encode('utf-8')
+            columns[f'{text}_offset'].append(len(heap))
+            columns[f'{text}_length'].append(len(encoded))
+            heap += encoded
+        columns['price_buy'].append(_cents(row['price_buy']))
+        columns['price_rent'].append(_cents(row['price_rent']))
+        columns['available'].append(1 if row['available'] else 0)
+        columns['created_at'].append(_to_micros(row.get('created_at')))
+        columns['updated_at'].append(_to_micros(row.get('updated_at')))
+        newest = max(newest, columns['updated_at'][-1])
+
+    available = [slot for slot in range(len(books)) if columns['available'][slot]]
+    orders = {
+        'title': array('I', sorted(available, key=lambda slot: (books[slot][1]['title'].casefold(), books[slot][0]))),
+        'author': array('I', sorted(available, key=lambda slot: (books[slot][1]['author'].casefold(), books[slot][0]))),
+        'price_buy': array('I', sorted(available, key=lambda slot: (columns['price_buy'][slot], books[slot][0]))),
+    }
+
+    temporary = f'{path}.{os.getpid()}.tmp'
+    with open(temporary, 'wb') as out:
+        out.write(HEADER.pack(MAGIC, len(books), len(available), newest, len(heap)))
+        out.write(_padding(HEADER.size))
+        for section in [columns[name] for name, code in COLUMNS] + [orders[name] for name in ORDERS]:
+            data = section.tobytes()
+            out.write(data)
+            out.write(_padding(len(data)))
+        out.write(heap)
+        out.flush()
+        os.fsync(out.fileno())
+    os.replace(temporary, path)
+
+class MappedSnapshot:
+    #read-only view of one snapshot file, nothing is decoded until a row is asked for
+
+    def __init__(self, path):
+        with open(path, 'rb') as source:
+            self.stamp = os.fstat(source.fileno())
+            self._map = mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.count, self.available, self.updated_at, heap_size = HEADER.unpack_from(self._map)
+        if magic != MAGIC:
+            raise ValueError(f'{path} is not a catalogue snapshot')
+
+        view = memoryview(self._map)
+        offset = HEADER.size + len(_padding(HEADER.size))
+        self.columns = {}
+        for name, code in COLUMNS:
+            size = self.count * array(code).itemsize
+            self.columns[name] = view[offset:offset + size].cast(code)
+            offset += size + len(_padding(size))
+        self.orders = {}
+        for name in ORDERS:
+            size = self.available * 4
+            self.orders[name] = view[offset:offset + size].cast('I')
+            offset += size + len(_padding(size))
+        self.heap = view[offset:offset + heap_size]
+
+    def slot(self, book_id):
+        ids = self.columns['id']
+        slot = bisect_left(ids, book_id)
+        return slot if slot < self.count and ids[slot] == book_id else None
+
+    def _text(self, name, slot):
+        offset = self.columns[f'{name}_offset'][slot]
+        return str(self.heap[offset:offset + self.columns[f'{name}_length'][slot]], 'utf-8')
+
+    def row(self, slot):
+        columns = self.columns
+        heap = self.heap
+        title = columns['title_offset'][slot]
+        author = columns['author_offset'][slot]
+        return {
+            'id': columns['id'][slot],
+            'title': str(heap[title:title + columns['title_length'][slot]], 'utf-8'),
+            'author': str(heap[author:author + columns['author_length'][slot]], 'utf-8'),
+            #scaleb keeps two places, 1200 cents is 12.00 like the DECIMAL column
+            'price_buy': Decimal(columns['price_buy'][slot]).scaleb(-2),
+            'price_rent': Decimal(columns['price_rent'][slot]).scaleb(-2),
+            'available': columns['available'][slot],
+            'created_at': _from_micros(columns['created_at'][slot]),
+            'updated_at': _from_micros(columns['updated_at'][slot]),
+        }
+
+    def key(self, column, slot):
+        #what the order for column is sorted by, (value, id)
+        if column == 'price_buy':
+            return self.columns['price_buy'][slot], self.columns['id'][slot]
+        return self._text(column, slot).casefold(), self.columns['id'][slot]
+
+class CatalogueFile:
+    #same reads as catalogue.CatalogueSnapshot, served from a MappedSnapshot
+    #a write shows up as upsert/remove of a row the mapped file doesn't have yet,
+    #it is kept in an overlay that reads consult straight away while the first
+    #worker to notice rebuilds the file from MySQL on a background thread (one
+    #at a time, through a lock file) and the rest just reopen it
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._mapped = None
+        self._loader = None
+        #book id -> row (None once deleted) the mapped file is behind on,
+        #dropped again once a rebuilt file covers it
+        self._overlay = {}
+        self._wake = threading.Event()
+        self._rebuilder = None
+        self.ready = False
+
+    @property
+    def updated_at(self):
+        return _from_micros(self._mapped.updated_at) if self._mapped else None
+
+    def load(self, loader, catch_up=None):
+        #loader() returns every books row, used whenever the file has to be (re)built
+        #catch_up() runs before the catalogue is marked ready, a file left behind
+        #by an earlier run can be missing edits made since
+        self._loader = loader
+        if not self.refresh():
+            with self._file_lock():
+                if not self.refresh():
+                    self._rebuild()
+        if self._mapped is not None and catch_up:
+            catch_up()
+        self._set_ready()
+
+    def build(self, rows):
+        with self._file_lock():
+            write_snapshot(self.path, rows)
+            self.refresh()
+        self._set_ready()
+
+    def _set_ready(self):
+        #without a mapped file every read would fail, callers fall back to MySQL
+        self.ready = self._mapped is not None
+        if not self.ready:
+            print(f"Catalogue snapshot {self.path} could not be mapped, not using it")
+
+    def refresh(self):
+        #maps the file again if it was replaced, False when there is no usable file
+        try:
+            stamp = os.stat(self.path)
+        except FileNotFoundError:
+            return False
+        with self._lock:
+            mapped = self._mapped
+            if mapped and (mapped.stamp.st_ino, mapped.stamp.st_mtime_ns) == (stamp.st_ino, stamp.st_mtime_ns):
+                return True
+            try:
+                self._mapped = MappedSnapshot(self.path)
+            except (ValueError, struct.error, TypeError) as e:
+                print(f"Ignoring catalogue snapshot {self.path}: {e}")
+                return False
+            return True
+
+    def _file_lock(self):
+        return _FileLock(f'{self.path}.lock')
+
+    def _rebuild(self):
+        write_snapshot(self.path, self._loader())
+        self.refresh()
+
+    def _in_file(self, book_id, row):
+        #whether the mapped file already has row (None: has no such book)
+        mapped = self._mapped
+        slot = mapped.slot(book_id)
+        if row is None:
+            return slot is None
+        return slot is not None and mapped.row(slot) == row
+
+    def upsert(self, row):
+        row = {name: row.get(name) for name in FIELDS}
+        if self.get(row['id']) != row:
+            self._queue(row['id'], row)
+
+    def remove(self, book_id):
+        if self.get(book_id) is not None:
+            self._queue(book_id, None)
+
+    def _queue(self, book_id, row):
+        #a rebuild streams the whole table, so it runs on its own thread rather
+        #than in the request that made the edit, edits queued meanwhile share it
+        with self._lock:
+            self._overlay[book_id] = row
+            if self._rebuilder is None:
+                self._rebuilder = threading.Thread(target=self._rebuild_pending, name='catalogue-rebuild', daemon=True)
+                self._rebuilder.start()
+        self._wake.set()
+
+    def _rebuild_pending(self):
+        while True:
+            self._wake.wait()
+            self._wake.clear()
+            with self._lock:
+                pending = dict(self._overlay)
+            if not pending:
+                continue
+            try:
+                with self._file_lock():
+                    #another worker may have rebuilt while we waited for the lock
+                    self.refresh()
+                    if not all(self._in_file(book_id, row) for book_id, row in pending.items()):
+                        self._rebuild()
+            except Exception as e:
+                #the overlay keeps reads right meanwhile
+                print(f"Failed to rebuild the catalogue snapshot, retrying: {e}")
+                time.sleep(RETRY_SECONDS)
+                self._wake.set()
+                continue
+            #the file now holds MySQL as of the rebuild, which is at least as new,
+            #anything changed again since stays in the overlay for the next round
+            with self._lock:
+                for book_id, row in pending.items():
+                    if self._overlay.get(book_id, MISSING) is row:
+                        del self._overlay[book_id]
+
+    def get(self, book_id):
+        row = self._overlay.get(book_id, MISSING)
+        if row is not MISSING:
+            return dict(row) if row is not None else None
+        mapped = self._mapped
+        slot = mapped.slot(book_id)
+        return mapped.row(slot) if slot is not None else None
+
+    def get_many(self, book_ids):
+        books = {}
+        for book_id in set(book_ids):
+            book = self.get(book_id)
+            if book is not None:
+                books[book_id] = book
+        return books
+
+    def _pending(self):
+        with self._lock:
+            return dict(self._overlay)
+
+    def ids(self):
+        ids = set(self._mapped.columns['id'])
+        for book_id, row in self._pending().items():
+            if row is None:
+                ids.discard(book_id)
+            else:
+                ids.add(book_id)
+        return ids
+
+    def _key(self, column, row):
+        #same as MappedSnapshot.key, for an overlay row
+        if column == 'price_buy':
+            return _cents(row['price_buy']), row['id']
+        return row[column].casefold(), row['id']
+
+    def page(self, column, limit=None, descending=False, after=None, match=None):
+        #available books ordered by column then id, see CatalogueSnapshot.page
+        mapped = self._mapped
+        overlay = self._pending()
+        order = mapped.orders[column]
+        start, end = 0, len(order)
+        target = None
+        if after is not None:
+            value, book_id = after
+            target = (_cents(value), book_id) if column == 'price_buy' else (value.casefold(), book_id)
+            #first position whose key is past target (ascending) or at it (descending)
+            low, high = 0, len(order)
+            while low < high:
+                middle = (low + high) // 2
+                key = mapped.key(column, order[middle])
+                if key < target or (not descending and key == target):
+                    low = middle + 1
+                else:
+                    high = middle
+            if descending:
+                end = low
+            else:
+                start = low
+        positions = range(end - 1, start - 1, -1) if descending else range(start, end)
+
+        if overlay:
+            #books in the overlay are skipped in the file and merged in from the overlay
+            ids = mapped.columns['id']
+            from_file = ((mapped.key(column, order[position]), order[position], None)
+                         for position in positions if ids[order[position]] not in overlay)
+            from_overlay = sorted(
+                ((self._key(column, row), None, row) for row in overlay.values()
+                 if row is not None and row['available']
+                 and (target is None or (self._key(column, row) < target if descending
+                                         else self._key(column, row) > target))),
+                key=lambda entry: entry[0], reverse=descending
+            )
+            entries = heapq.merge(from_file, from_overlay, key=lambda entry: entry[0], reverse=descending)
+        else:
+            entries = ((None, order[position], None) for position in positions)
+
+        books = []
+        for key, slot, row in entries:
+            book = dict(row) if row is not None else mapped.row(slot)
+            if match is None or match(book):
+                books.append(book)
+                if limit is not None and len(books) == limit:
+                    break
+        return books
+
+    def stats(self):
+        mapped = self._mapped
+        books, available = mapped.count, mapped.available
+        #books the overlay adds, removes or changes the availability of
+        for book_id, row in self._pending().items():
+            slot = mapped.slot(book_id)
+            was = slot is not None and mapped.columns['available'][slot]
+            books += (row is not None) - (slot is not None)
+            available += bool(row is not None and row['available']) - bool(was)
+        return {
+            'books': books,
+            'available': available,
+            'bytes': len(mapped._map)
+        }
+
+class _FileLock:
+    #exclusive lock shared by every process using the snapshot, so rebuilds don't overlap
+
+    def __init__(self, path):
+        self.path = path
+
+    def __enter__(self):
+        #preforked workers mean a unix host, fcntl is only imported when a file store is used
+        import fcntl
+        self._file = open(self.path, 'a')
+        fcntl.flock(self._file, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        import fcntl
+        fcntl.flock(self._file, fcntl.LOCK_UN)
+        self._file.close()
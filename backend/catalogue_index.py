@@ -0,0 +1,199 @@
+from array import array
+from bisect import bisect_left, bisect_right
+from itertools import compress
+import threading
+
+#in-memory price/author index behind the filtered form of GET /api/books
+#(min_price, max_price, price=buy|rent, author, available)
+
+#flips availability flags, 1 -> 0 and 0 -> 1
+INVERT = bytes([1, 0]) + bytes(254)
+
+def normalize(text):
+    return ' '.join(text.lower().split())
+
+class PriceColumn:
+    #prices in ascending order with the matching book ids and availability
+    #alongside, equal prices are kept in id order so a range comes out ready sorted
+
+    def __init__(self):
+        self.prices = array('d')
+        self.ids = array('I')
+        self.available = bytearray()
+
+    def load(self, rows):
+        #rows are (price, id, available)
+        rows = sorted(rows)
+        self.prices = array('d', (price for price, book_id, available in rows))
+        self.ids = array('I', (book_id for price, book_id, available in rows))
+        self.available = bytearray(available for price, book_id, available in rows)
+
+    def _position(self, price, book_id):
+        start = bisect_left(self.prices, price)
+        end = bisect_right(self.prices, price, start)
+        return bisect_left(self.ids, book_id, start, end)
+
+    def insert(self, price, book_id, available):
+        position = self._position(price, book_id)
+        self.prices.insert(position, price)
+        self.ids.insert(position, book_id)
+        self.available.insert(position, available)
+
+    def remove(self, price, book_id):
+        position = self._position(price, book_id)
+        del self.prices[position]
+        del self.ids[position]
+        del self.available[position]
+
+    def slice(self, start, end, available=None):
+        #ids in start..end, only those with that availability unless it is None
+        ids = self.ids[start:end]
+        if available is None:
+            return list(ids)
+        flags = self.available[start:end]
+        if not available:
+            flags = flags.translate(INVERT)
+        return list(compress(ids, flags))
+
+    def range(self, low=None, high=None):
+        #slice bounds of the books priced low..high, both inclusive
+        start = 0 if low is None else bisect_left(self.prices, low)
+        end = len(self.prices) if high is None else bisect_right(self.prices, high)
+        return start, end
+
+class CatalogueIndex:
+    #one PriceColumn per price, a bucket of ids per author, and per book the
+    #fields the filters and sorts look at
+
+    PRICES = ('buy', 'rent')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.ready = False
+        self._clear()
+
+    def _clear(self):
+        self._columns = {price: PriceColumn() for price in self.PRICES}
+        #normalized author -> set of book ids
+        self._authors = {}
+        #book id -> (title, author, buy, rent, available), text normalized
+        self._books = {}
+
+    def build(self, rows):
+        #rows need id, title, author, price_buy, price_rent and available
+        with self._lock:
+            self._clear()
+            for row in rows:
+                self._store(row['id'], row['title'], row['author'],
+                            row['price_buy'], row['price_rent'], row['available'])
+            for price, column in self._columns.items():
+                field = 2 if price == 'buy' else 3
+                column.load((book[field], book_id, book[4]) for book_id, book in self._books.items())
+            self.ready = True
+
+    def upsert(self, book_id, title, author, price_buy, price_rent, available):
+        with self._lock:
+            self._remove(book_id)
+            book = self._store(book_id, title, author, price_buy, price_rent, available)
+            self._columns['buy'].insert(book[2], book_id, book[4])
+            self._columns['rent'].insert(book[3], book_id, book[4])
+
+    def remove(self, book_id):
+        with self._lock:
+            self._remove(book_id)
+
+    def _store(self, book_id, title, author, price_buy, price_rent, available):
+        book = (normalize(title), normalize(author), float(price_buy), float(price_rent), bool(available))
+        self._books[book_id] = book
+        self._authors.setdefault(book[1], set()).add(book_id)
+        return book
+
+    def _remove(self, book_id):
+        book = self._books.pop(book_id, None)
+        if book is None:
+            return
+        bucket = self._authors[book[1]]
+        bucket.discard(book_id)
+        if not bucket:
+            del self._authors[book[1]]
+        self._columns['buy'].remove(book[2], book_id)
+        self._columns['rent'].remove(book[3], book_id)
+
+    def _sort_key(self, sort, price):
+        #(sort value, id) for a book id, sort is title, author or price
+        books = self._books
+        if sort == 'title':
+            return lambda book_id: (books[book_id][0], book_id)
+        if sort == 'author':
+            return lambda book_id: (books[book_id][1], book_id)
+        field = 2 if price == 'buy' else 3
+        return lambda book_id: (books[book_id][field], book_id)
+
+    def query(self, price='buy', min_price=None, max_price=None, author=None,
+              available=True, keyword='', sort='title', descending=False,
+              after=None, limit=50):
+        #returns (ids of one page, (sort value, id) of its last book or None, total matches)
+        #available=None means either, keyword is a substring of title or author
+        #after is the (sort value, id) the previous page ended on
+        field = 2 if price == 'buy' else 3
+        keyword = normalize(keyword)
+
+        with self._lock:
+            books = self._books
+            column = self._columns[price]
+            start, end = column.range(min_price, max_price)
+
+            #walk whichever of the author bucket and the price range is smaller
+            bucket = None
+            if author is not None:
+                bucket = self._authors.get(normalize(author), set())
+            if bucket is not None and len(bucket) < end - start:
+                low = float('-inf') if min_price is None else min_price
+                high = float('inf') if max_price is None else max_price
+                candidates = [book_id for book_id in bucket if low <= books[book_id][field] <= high
+                              and (available is None or books[book_id][4] == available)]
+                in_order = False
+            else:
+                candidates = column.slice(start, end, available)
+                if bucket is not None:
+                    candidates = [book_id for book_id in candidates if book_id in bucket]
+                #the range is already in (price, id) order
+                in_order = sort == 'price'
+
+            if keyword:
+                candidates = [book_id for book_id in candidates
+                              if keyword in books[book_id][0] or keyword in books[book_id][1]]
+
+            key = self._sort_key(sort, price)
+            if not in_order:
+                candidates.sort(key=key)
+            if descending:
+                candidates.reverse()
+
+            total = len(candidates)
+            position = 0
+            if after is not None:
+                #first book past the cursor, binary search over the sorted ids
+                after = tuple(after)
+                low, high = 0, total
+                while low < high:
+                    middle = (low + high) // 2
+                    value = key(candidates[middle])
+                    if (value > after) if not descending else (value < after):
+                        high = middle
+                    else:
+                        low = middle + 1
+                position = low
+
+            page = candidates[position:position + limit]
+            last = key(page[-1]) if page and position + limit < total else None
+            return page, last, total
+
+    def stats(self):
+        with self._lock:
+            return {
+                'books': len(self._books),
+                'authors': len(self._authors)
+            }
+
+catalogue_index = CatalogueIndex()
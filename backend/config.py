@@ -14,6 +14,21 @@ class Config:
     DB_USER = os.getenv('DB_USER', 'root')
     DB_PASSWORD = os.getenv('DB_PASSWORD', '')
     DB_NAME = os.getenv('DB_NAME', 'bookstore')
+    #requests wait up to DB_POOL_TIMEOUT seconds for a free connection, at most
+    #DB_POOL_MAX_WAITERS at a time, after that they get a 503 with Retry-After
+    DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '10'))
+    DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '2'))
+    DB_POOL_MAX_WAITERS = int(os.getenv('DB_POOL_MAX_WAITERS', '50'))
+    DB_POOL_RETRY_AFTER = int(os.getenv('DB_POOL_RETRY_AFTER', '1'))
+    #server-side prepared statements, cached per pooled connection
+    #off until benchmarks/prepared_statements.py shows a win, each execute costs a
+    #COM_STMT_RESET round trip on top of the COM_STMT_EXECUTE
+    DB_PREPARED_STATEMENTS = os.getenv('DB_PREPARED_STATEMENTS', 'False').lower() == 'true'
+    DB_STATEMENT_CACHE_SIZE = int(os.getenv('DB_STATEMENT_CACHE_SIZE', '64'))
+    #resetting the session on checkout would throw the prepared statements away
+    DB_POOL_RESET_SESSION = os.getenv(
+        'DB_POOL_RESET_SESSION', 'False' if DB_PREPARED_STATEMENTS else 'True'
+    ).lower() == 'true'
     
     #jwt tokens
     JWT_SECRET = os.getenv('JWT_SECRET', SECRET_KEY)
@@ -21,3 +36,62 @@ class Config:
     JWT_EXPIRATION_HOURS = 24
     
     CORS_ORIGINS = os.getenv('CORS_ORIGINS', '*')
+    
+    #cache
+    CACHE_MAX_ENTRIES = int(os.getenv('CACHE_MAX_ENTRIES', '1000'))
+    CACHE_MAX_BYTES = int(os.getenv('CACHE_MAX_BYTES', str(64 * 1024 * 1024)))
+    CACHE_SWEEP_SECONDS = int(os.getenv('CACHE_SWEEP_SECONDS', '60'))
+    CACHE_LOAD_TIMEOUT = float(os.getenv('CACHE_LOAD_TIMEOUT', '5'))
+    CACHE_REFRESH_WORKERS = int(os.getenv('CACHE_REFRESH_WORKERS', '2'))
+    CACHE_STRIPES = int(os.getenv('CACHE_STRIPES', '16'))
+    #memory (per worker), redis (shared) or tiered (local L1 in front of redis)
+    CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'memory')
+    REDIS_URL = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
+    CACHE_L1_MAX_ENTRIES = int(os.getenv('CACHE_L1_MAX_ENTRIES', '200'))
+    CACHE_L1_TTL = int(os.getenv('CACHE_L1_TTL', '5'))
+    #cross-worker invalidation: none, multicast (this host) or redis (pub/sub)
+    CACHE_BUS = os.getenv('CACHE_BUS', 'none')
+    CACHE_BUS_GROUP = os.getenv('CACHE_BUS_GROUP', '239.255.42.99')
+    CACHE_BUS_PORT = int(os.getenv('CACHE_BUS_PORT', '50099'))
+    CACHE_BUS_CHANNEL = os.getenv('CACHE_BUS_CHANNEL', 'bookstore:invalidation')
+    #edits reach every worker when a bus is on, so book lists can live longer, but a
+    #message can still be lost (multicast is udp, redis drops it while reconnecting)
+    #so the ttl bounds how long a missed edit stays visible
+    BOOKS_CACHE_TTL = int(os.getenv('BOOKS_CACHE_TTL', '30' if CACHE_BUS == 'none' else '600'))
+    BOOK_CACHE_TTL = int(os.getenv('BOOK_CACHE_TTL', '30' if CACHE_BUS == 'none' else '600'))
+    #ids that don't exist, kept short so new books show up quickly
+    BOOK_NOT_FOUND_TTL = int(os.getenv('BOOK_NOT_FOUND_TTL', '10'))
+    BOOKS_CACHE_STALE_SECONDS = int(os.getenv('BOOKS_CACHE_STALE_SECONDS', '300'))
+    
+    #book search: fulltext uses the ft_title_author index (older databases get it
+    #from database/migrations/003_books_fulltext.sql), like is the old LIKE '%q%'
+    #scan for databases without it, trigram keeps an in-memory index per worker
+    #(substring matches plus typo tolerance, no schema change)
+    SEARCH_ENGINE = os.getenv('SEARCH_ENGINE', 'fulltext')
+    SEARCH_MODE = os.getenv('SEARCH_MODE', 'boolean')
+    #innodb_ft_min_token_size, shorter words can't match a FULLTEXT index
+    SEARCH_MIN_WORD_LENGTH = int(os.getenv('SEARCH_MIN_WORD_LENGTH', '3'))
+    #trigram: share of the query's trigrams a near miss needs, and how many are returned
+    SEARCH_FUZZY_SIMILARITY = float(os.getenv('SEARCH_FUZZY_SIMILARITY', '0.3'))
+    SEARCH_FUZZY_LIMIT = int(os.getenv('SEARCH_FUZZY_LIMIT', '50'))
+    #paged trigram searches with more matches than this use the SQL search instead
+    SEARCH_ID_LIST_MAX = int(os.getenv('SEARCH_ID_LIST_MAX', '5000'))
+    
+    #GET /api/books/suggest, built per worker at startup, popularity comes from order_items
+    #off by default: every worker streams the whole books table while booting and
+    #won't start while MySQL is down, the endpoint answers 404 until it is turned on
+    SUGGEST_ENABLED = os.getenv('SUGGEST_ENABLED', 'False').lower() == 'true'
+    SUGGEST_POPULARITY_REFRESH = int(os.getenv('SUGGEST_POPULARITY_REFRESH', '300'))
+    
+    #price/author filters on GET /api/books, built per worker at startup
+    #off by default for the same reason as SUGGEST_ENABLED, filtered requests get a 501
+    CATALOGUE_INDEX_ENABLED = os.getenv('CATALOGUE_INDEX_ENABLED', 'False').lower() == 'true'
+    
+    #serve every book read from a per-worker copy of the books table instead of MySQL
+    #writes are applied as they happen, the reconcile picks up anything the bus missed
+    CATALOGUE_SNAPSHOT = os.getenv('CATALOGUE_SNAPSHOT', 'False').lower() == 'true'
+    CATALOGUE_RECONCILE_SECONDS = int(os.getenv('CATALOGUE_RECONCILE_SECONDS', '60'))
+    #memory keeps the copy in each worker, file maps one binary snapshot at
+    #CATALOGUE_FILE shared by every worker on the host
+    CATALOGUE_STORE = os.getenv('CATALOGUE_STORE', 'memory')
+    CATALOGUE_FILE = os.getenv('CATALOGUE_FILE', 'catalogue.bin')
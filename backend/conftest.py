@@ -0,0 +1 @@
+#lets the tests under tests/ import the backend modules the way app.py does
@@ -1,12 +1,95 @@
+from collections import OrderedDict
+from contextlib import contextmanager
+import threading
+import time
 import mysql.connector
 from mysql.connector import pooling
+from flask import g, has_app_context
 from config import Config
 
+class PoolExhausted(Exception):
+    #no connection came free in time (or too many requests were already waiting),
+    #app.py turns this into a 503 with Retry-After
+    pass
+
+class BoundedConnectionPool(pooling.MySQLConnectionPool):
+    #get_connection waits up to timeout seconds for a free connection instead of
+    #failing straight away, with at most max_waiters requests queued at once
+
+    def __init__(self, timeout, max_waiters, **kwargs):
+        #set before the parent fills the pool, that calls add_connection
+        self.timeout = timeout
+        self.max_waiters = max_waiters
+        self._slots = threading.Semaphore(kwargs.get('pool_size', 5))
+        self._lock = threading.Lock()
+        self.in_use = 0
+        self.waiters = 0
+        self.waits = 0
+        self.wait_seconds = 0.0
+        self.timeouts = 0
+        self.rejected = 0
+        super().__init__(**kwargs)
+
+    def get_connection(self):
+        if not self._slots.acquire(blocking=False):
+            self._wait_for_slot()
+        try:
+            conn = super().get_connection()
+        except Exception:
+            self._slots.release()
+            raise
+        with self._lock:
+            self.in_use += 1
+        return conn
+
+    def _wait_for_slot(self):
+        with self._lock:
+            if self.waiters >= self.max_waiters:
+                self.rejected += 1
+                raise PoolExhausted('Too many requests waiting for a database connection')
+            self.waiters += 1
+
+        started = time.monotonic()
+        try:
+            acquired = self._slots.acquire(timeout=self.timeout)
+        finally:
+            with self._lock:
+                self.waiters -= 1
+                self.waits += 1
+                self.wait_seconds += time.monotonic() - started
+                if not acquired:
+                    self.timeouts += 1
+        if not acquired:
+            raise PoolExhausted(f'No database connection free after {self.timeout}s')
+
+    def add_connection(self, cnx=None):
+        #also how PooledMySQLConnection.close() hands a connection back
+        super().add_connection(cnx)
+        if cnx is not None:
+            with self._lock:
+                self.in_use -= 1
+            self._slots.release()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size': self.pool_size,
+                'in_use': self.in_use,
+                'waiters': self.waiters,
+                'waits': self.waits,
+                'wait_seconds': round(self.wait_seconds, 6),
+                'timeouts': self.timeouts,
+                'rejected': self.rejected
+            }
+
 #connection pool
-db_pool = pooling.MySQLConnectionPool(
+db_pool = BoundedConnectionPool(
+    timeout=Config.DB_POOL_TIMEOUT,
+    max_waiters=Config.DB_POOL_MAX_WAITERS,
     pool_name="bookstore_pool",
-    pool_size=10,
-    pool_reset_session=True,
+    pool_size=Config.DB_POOL_SIZE,
+    #a session reset drops server-side prepared statements, see execute_query
+    pool_reset_session=Config.DB_POOL_RESET_SESSION,
     host=Config.DB_HOST,
     user=Config.DB_USER,
     password=Config.DB_PASSWORD,
@@ -17,29 +100,171 @@ db_pool = pooling.MySQLConnectionPool(
 def get_db_connection():
     return db_pool.get_connection()
 
-def execute_query(query, params=None, fetch_one=False, fetch_all=False, commit=False):
+def _count_round_trips(n=1):
+    if has_app_context():
+        g.db_round_trips = g.get('db_round_trips', 0) + n
+
+def _request_connection():
+    #inside a request every query shares one pooled connection, checked out on first use
+    #outside of one (background threads, scripts) this returns None
+    if not has_app_context():
+        return None
+    if 'db_conn' not in g:
+        g.db_conn = get_db_connection()
+        #checkout pings the server, handing it back may reset the session
+        _count_round_trips(2 if db_pool.reset_session else 1)
+    return g.db_conn
+
+def _release(conn):
+    #without a session reset nothing else ends an open read transaction
+    #close() runs even if the rollback fails, or the pool slot would be lost for good
+    try:
+        if not db_pool.reset_session and conn.in_transaction:
+            conn.rollback()
+    finally:
+        conn.close()
+
+def release_request_connection(error=None):
+    #teardown hook, hands the request's connection back to the pool
+    conn = g.pop('db_conn', None)
+    g.pop('db_transaction', None)
+    if conn is not None:
+        _release(conn)
+
+def release_connection():
+    #hands the request's connection back before slow work that needs no database
+    #(sending email), a later query in the same request just checks out another
+    if has_app_context() and g.get('db_transaction', False):
+        raise RuntimeError('Cannot release the connection inside a transaction')
+    release_request_connection()
+
+@contextmanager
+def _connection():
+    conn = _request_connection()
+    if conn is not None:
+        yield conn
+        return
+    conn = get_db_connection()
+    try:
+        yield conn
+    finally:
+        _release(conn)
+
+def _statement_cursor(conn, query):
+    #prepared cursors are kept per physical connection, keyed by the sql text
+    #returns the cached cursor and the exact string it was prepared with, the
+    #connector only skips re-preparing when it sees that same string object again
+    cnx = getattr(conn, '_cnx', conn)
+    statements = getattr(cnx, 'bookstore_statements', None)
+    if statements is None:
+        statements = cnx.bookstore_statements = OrderedDict()
+
+    if query in statements:
+        statements.move_to_end(query)
+        return statements[query]
+
+    cursor = conn.cursor(prepared=True, dictionary=True)
+    statements[query] = (cursor, query)
+    if len(statements) > Config.DB_STATEMENT_CACHE_SIZE:
+        old_cursor, old_query = statements.popitem(last=False)[1]
+        old_cursor.close()
+    return cursor, query
+
+def _forget_statements(conn):
+    #after an error the statements may be gone on the server (reconnect), prepare them again
+    cnx = getattr(conn, '_cnx', conn)
+    statements = getattr(cnx, 'bookstore_statements', {})
+    for cursor, query in statements.values():
+        try:
+            cursor.close()
+        except Exception:
+            pass
+    statements.clear()
+
+def execute_query(query, params=None, fetch_one=False, fetch_all=False, commit=False, prepared=True):
     #runs a query and returns results
+    #fixed sql runs as a cached server-side prepared statement when DB_PREPARED_STATEMENTS
+    #is on, pass prepared=False for sql that is built per call (IN lists)
+    #inside transaction() the commit is left to the transaction
+    with _connection() as conn:
+        in_transaction = has_app_context() and g.get('db_transaction', False)
+        prepared = prepared and Config.DB_PREPARED_STATEMENTS
+        if prepared:
+            cursor, query = _statement_cursor(conn, query)
+        else:
+            cursor = conn.cursor(dictionary=True)
+        result = None
+
+        try:
+            cursor.execute(query, params or ())
+            #the connector sends COM_STMT_RESET before every prepared execute
+            _count_round_trips(2 if prepared else 1)
+
+            if fetch_one:
+                result = cursor.fetchone()
+                if prepared:
+                    #the cached cursor is reused, don't leave rows behind
+                    cursor.fetchall()
+            elif fetch_all:
+                result = cursor.fetchall()
+
+            if commit:
+                if not in_transaction:
+                    conn.commit()
+                    _count_round_trips()
+                result = cursor.lastrowid if cursor.lastrowid else cursor.rowcount
+
+        except Exception as e:
+            if prepared:
+                _forget_statements(conn)
+            if not in_transaction:
+                conn.rollback()
+            raise e
+        finally:
+            if not prepared:
+                cursor.close()
+
+    return result
+
+@contextmanager
+def transaction():
+    #one connection and one commit for several statements, rolls back on error
+    #execute_query calls made inside the block join the same transaction
+    with _connection() as conn:
+        nested = has_app_context() and g.get('db_transaction', False)
+        if has_app_context():
+            g.db_transaction = True
+        cursor = conn.cursor(dictionary=True)
+
+        try:
+            yield cursor
+            if not nested:
+                conn.commit()
+                _count_round_trips()
+        except Exception:
+            if not nested:
+                conn.rollback()
+            raise
+        finally:
+            cursor.close()
+            if has_app_context() and not nested:
+                g.db_transaction = False
+
+def stream_query(query, params=None, batch_size=500):
+    #yields lists of up to batch_size rows from an unbuffered cursor so big
+    #tables never sit in memory at once
+    #uses its own connection, held until the generator is used up or closed
     conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
-    result = None
-    
+    cursor = conn.cursor(dictionary=True, buffered=False)
+
     try:
         cursor.execute(query, params or ())
-        
-        if fetch_one:
-            result = cursor.fetchone()
-        elif fetch_all:
-            result = cursor.fetchall()
-        
-        if commit:
-            conn.commit()
-            result = cursor.lastrowid if cursor.lastrowid else cursor.rowcount
-            
-    except Exception as e:
-        conn.rollback()
-        raise e
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield rows
     finally:
+        #closing drains whatever the caller didn't read
         cursor.close()
-        conn.close()
-    
-    return result
+        _release(conn)
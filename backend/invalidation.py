@@ -0,0 +1,130 @@
+import json
+import socket
+import struct
+import threading
+import time
+import uuid
+from config import Config
+from cache import invalidate_book
+
+#every worker gets its own id so it can skip its own messages
+ORIGIN = uuid.uuid4().hex
+
+_handlers = [invalidate_book]
+
+def subscribe(handler):
+    #handler(book_id, *texts) runs in every worker when a book changes
+    _handlers.append(handler)
+
+def _apply(message):
+    for handler in _handlers:
+        try:
+            handler(message['book_id'], *message['texts'])
+        except Exception as e:
+            print(f"Invalidation handler failed: {e}")
+
+class LocalBus:
+    #single process, nothing to send
+
+    def start(self, on_message):
+        pass
+
+    def send(self, payload):
+        pass
+
+class MulticastBus:
+    #udp multicast on the loopback interface, reaches every worker on this host
+
+    def __init__(self, group, port):
+        self.group = group
+        self.port = port
+        self._sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+        self._sender.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, 0)
+        self._sender.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_LOOP, 1)
+        self._sender.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_IF, socket.inet_aton('127.0.0.1'))
+
+    def start(self, on_message):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if hasattr(socket, 'SO_REUSEPORT'):
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        sock.bind(('', self.port))
+        membership = struct.pack('4s4s', socket.inet_aton(self.group), socket.inet_aton('127.0.0.1'))
+        sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, membership)
+
+        def listen():
+            while True:
+                payload, addr = sock.recvfrom(65535)
+                on_message(payload)
+
+        threading.Thread(target=listen, name='invalidation-bus', daemon=True).start()
+
+    def send(self, payload):
+        self._sender.sendto(payload, (self.group, self.port))
+
+class RedisBus:
+    #redis pub/sub, reaches workers on every host using the same server
+
+    def __init__(self, url, channel):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.channel = channel
+
+    def start(self, on_message):
+        handlers = {self.channel: lambda message: on_message(message['data'])}
+        pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(**handlers)
+
+        def resubscribe(error, pubsub, thread):
+            #without a handler the listening thread dies on a dropped connection and
+            #this worker silently stops hearing about edits, so reconnect instead
+            print(f"Invalidation bus disconnected, resubscribing: {error}")
+            time.sleep(1)
+            try:
+                pubsub.reset()
+                pubsub.subscribe(**handlers)
+            except Exception as e:
+                print(f"Failed to resubscribe to the invalidation bus: {e}")
+
+        pubsub.run_in_thread(sleep_time=1, daemon=True, exception_handler=resubscribe)
+
+    def send(self, payload):
+        self.client.publish(self.channel, payload)
+
+def create_bus():
+    if Config.CACHE_BUS == 'multicast':
+        return MulticastBus(Config.CACHE_BUS_GROUP, Config.CACHE_BUS_PORT)
+    if Config.CACHE_BUS == 'redis':
+        return RedisBus(Config.REDIS_URL, Config.CACHE_BUS_CHANNEL)
+    if Config.CACHE_BUS == 'none':
+        return LocalBus()
+    raise ValueError(f'Unknown CACHE_BUS: {Config.CACHE_BUS}')
+
+bus = create_bus()
+_started = False
+_start_lock = threading.Lock()
+
+def _on_message(payload):
+    try:
+        message = json.loads(payload)
+    except ValueError:
+        return
+    if message.get('origin') != ORIGIN:
+        _apply(message)
+
+def start_bus():
+    #call once per worker process (after forking), listening is a daemon thread
+    global _started
+    with _start_lock:
+        if not _started:
+            bus.start(_on_message)
+            _started = True
+
+def publish_book_change(book_id, *texts):
+    #applies the change here right away, then tells the other workers
+    message = {'origin': ORIGIN, 'book_id': book_id, 'texts': list(texts)}
+    _apply(message)
+    try:
+        bus.send(json.dumps(message).encode('utf-8'))
+    except Exception as e:
+        print(f"Failed to publish invalidation for book {book_id}: {e}")
@@ -1,28 +1,86 @@
 from flask import Blueprint, request, jsonify
+from datetime import datetime
 from auth.routes import role_required
 from models import (
-    get_all_orders, get_order_by_id, get_order_items,
+    stream_all_orders, get_order_by_id, get_order_items,
     update_order_payment_status, create_book, update_book,
-    get_all_books, get_all_books_for_manager, get_book_by_id
+    stream_all_books_for_manager, get_book_by_id, get_orders_page,
+    BOOK_FIELDS, ORDER_FIELDS
 )
 from cache import cache
+from response_cache import stream_rows
+from pagination import encode_cursor, decode_cursor, parse_limit, parse_datetime
+from projection import parse_fields, project
+from db import PoolExhausted
 
 manager_bp = Blueprint('manager', __name__, url_prefix='/api/manager')
 
+PAYMENT_STATUSES = ['Pending', 'Paid', 'Cancelled']
+
+def decode_order_cursor(cursor):
+    #(created_at, id) of the last order sent, raises ValueError for anything else
+    after = decode_cursor(cursor, 2)
+    created_at, order_id = after
+    if not isinstance(created_at, datetime) or not isinstance(order_id, int) or isinstance(order_id, bool):
+        raise ValueError('Invalid cursor')
+    return after
+
 @manager_bp.route('/orders', methods=['GET'])
 @role_required('manager')
 def get_orders():
+    #filters: payment_status, from (inclusive), to (exclusive), fields= narrows the columns
+    #with limit and/or cursor the result is one page plus next_cursor,
+    #otherwise every matching order is streamed
     try:
-        orders = get_all_orders()
-        
+        fields = parse_fields(request.args.get('fields'), ORDER_FIELDS)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    payment_status = request.args.get('payment_status')
+    if payment_status and payment_status not in PAYMENT_STATUSES:
+        return jsonify({
+            'error': f'Invalid payment status. Allowed values: {", ".join(PAYMENT_STATUSES)}'
+        }), 400
+    
+    try:
+        date_from = parse_datetime(request.args.get('from'))
+        date_to = parse_datetime(request.args.get('to'))
+    except ValueError:
+        return jsonify({'error': 'from and to must be dates (YYYY-MM-DD) or ISO timestamps'}), 400
+    
+    try:
+        if 'limit' not in request.args and 'cursor' not in request.args:
+            #streamed in batches, add ?format=ndjson for one order per line
+            return stream_rows('orders', stream_all_orders(payment_status, date_from, date_to, fields))
+        
+        try:
+            limit = parse_limit(request.args.get('limit'))
+            cursor = request.args.get('cursor')
+            after = decode_order_cursor(cursor) if cursor else None
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        #one extra row tells us whether there is a next page
+        orders = get_orders_page(limit + 1, after, payment_status, date_from, date_to, fields)
+        next_cursor = None
+        if len(orders) > limit:
+            orders = orders[:limit]
+            next_cursor = encode_cursor(orders[-1]['created_at'], orders[-1]['id'])
+        
+        #drop created_at again if it wasn't asked for
+        orders = [project(order, fields) for order in orders]
         for order in orders:
-            order['total_amount'] = float(order['total_amount'])
+            if 'total_amount' in order:
+                order['total_amount'] = float(order['total_amount'])
         
         return jsonify({
             'orders': orders,
-            'count': len(orders)
+            'count': len(orders),
+            'next_cursor': next_cursor
         }), 200
         
+    except PoolExhausted:
+        raise
     except Exception as e:
         return jsonify({'error': f'Failed to retrieve orders: {str(e)}'}), 500
 
@@ -46,6 +104,8 @@ def get_order_details(order_id):
             'items': items
         }), 200
         
+    except PoolExhausted:
+        raise
     except Exception as e:
         return jsonify({'error': f'Failed to retrieve order: {str(e)}'}), 500
 
@@ -59,10 +119,9 @@ def update_payment_status(order_id):
     
     payment_status = data['payment_status']
     
-    allowed_statuses = ['Pending', 'Paid', 'Cancelled']
-    if payment_status not in allowed_statuses:
+    if payment_status not in PAYMENT_STATUSES:
         return jsonify({
-            'error': f'Invalid payment status. Allowed values: {", ".join(allowed_statuses)}'
+            'error': f'Invalid payment status. Allowed values: {", ".join(PAYMENT_STATUSES)}'
         }), 400
     
     order = get_order_by_id(order_id)
@@ -78,6 +137,8 @@ def update_payment_status(order_id):
             'payment_status': payment_status
         }), 200
         
+    except PoolExhausted:
+        raise
     except Exception as e:
         return jsonify({'error': f'Failed to update payment status: {str(e)}'}), 500
 
@@ -85,17 +146,16 @@ def update_payment_status(order_id):
 @role_required('manager')
 def get_all_books_manager():
     try:
-        books = get_all_books_for_manager()
-        
-        for book in books:
-            book['price_buy'] = float(book['price_buy'])
-            book['price_rent'] = float(book['price_rent'])
-        
-        return jsonify({
-            'books': books,
-            'count': len(books)
-        }), 200
+        fields = parse_fields(request.args.get('fields'), BOOK_FIELDS)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    try:
+        #streamed in batches, add ?format=ndjson for one book per line
+        return stream_rows('books', stream_all_books_for_manager(fields))
         
+    except PoolExhausted:
+        raise
     except Exception as e:
         return jsonify({'error': f'Failed to retrieve books: {str(e)}'}), 500
 
@@ -127,8 +187,6 @@ def add_book():
     try:
         book_id = create_book(title, author, price_buy, price_rent)
         
-        cache.clear()
-        
         return jsonify({
             'message': 'Book added successfully',
             'book_id': book_id,
@@ -136,6 +194,8 @@ def add_book():
             'author': author
         }), 201
         
+    except PoolExhausted:
+        raise
     except Exception as e:
         return jsonify({'error': f'Failed to add book: {str(e)}'}), 500
 
@@ -172,12 +232,18 @@ def edit_book(book_id):
     try:
         update_book(book_id, title, author, price_buy, price_rent, available)
         
-        cache.clear()
-        
         return jsonify({
             'message': 'Book updated successfully',
             'book_id': book_id
         }), 200
         
+    except PoolExhausted:
+        raise
     except Exception as e:
         return jsonify({'error': f'Failed to update book: {str(e)}'}), 500
+
+@manager_bp.route('/cache/stats', methods=['GET'])
+@role_required('manager')
+def get_cache_stats():
+    #hits, misses, evictions and load times per key namespace for tuning ttls
+    return jsonify(cache.stats()), 200
@@ -0,0 +1,72 @@
+from cache import cache
+from db import db_pool
+from search_index import search_index
+from suggest_index import suggest_index
+from catalogue_index import catalogue_index
+from catalogue import catalogue
+
+#prometheus text format for GET /metrics
+
+def _line(name, value, labels=None):
+    if value is None:
+        return None
+    if labels:
+        label_text = ','.join(f'{k}="{v}"' for k, v in labels.items())
+        return f'{name}{{{label_text}}} {value}'
+    return f'{name} {value}'
+
+def cache_lines(stats, labels=None):
+    lines = []
+    labels = labels or {}
+    for ns, counters in stats.get('namespaces', {}).items():
+        ns_labels = dict(labels, namespace=ns)
+        for field in ('hits', 'stale_hits', 'misses', 'loads', 'load_errors', 'expirations', 'evictions'):
+            lines.append(_line(f'bookstore_cache_{field}_total', counters[field], ns_labels))
+        lines.append(_line('bookstore_cache_load_seconds_total', counters['load_seconds'], ns_labels))
+        if 'entries' in counters:
+            lines.append(_line('bookstore_cache_entries', counters['entries'], ns_labels))
+    if 'bytes' in stats:
+        lines.append(_line('bookstore_cache_bytes', stats['bytes'], labels))
+    for tier in ('l1', 'l2'):
+        if tier in stats:
+            lines.extend(cache_lines(stats[tier], dict(labels, tier=tier)))
+    return lines
+
+def pool_lines(stats):
+    return [
+        _line('bookstore_db_pool_size', stats['size']),
+        _line('bookstore_db_pool_in_use', stats['in_use']),
+        _line('bookstore_db_pool_waiters', stats['waiters']),
+        _line('bookstore_db_pool_waits_total', stats['waits']),
+        _line('bookstore_db_pool_wait_seconds_total', stats['wait_seconds']),
+        _line('bookstore_db_pool_timeouts_total', stats['timeouts']),
+        _line('bookstore_db_pool_rejected_total', stats['rejected'])
+    ]
+
+def search_index_lines(stats):
+    return [
+        _line('bookstore_search_index_books', stats['books']),
+        _line('bookstore_search_index_retired_slots', stats['retired_slots']),
+        _line('bookstore_search_index_trigrams', stats['trigrams']),
+        _line('bookstore_search_index_postings', stats['postings'])
+    ]
+
+def render_metrics():
+    lines = cache_lines(cache.stats()) + pool_lines(db_pool.stats())
+    if search_index.ready:
+        lines += search_index_lines(search_index.stats())
+    if suggest_index.ready:
+        stats = suggest_index.stats()
+        lines.append(_line('bookstore_suggest_index_keys', stats['keys']))
+        lines.append(_line('bookstore_suggest_index_cached_prefixes', stats['cached_prefixes']))
+    if catalogue_index.ready:
+        stats = catalogue_index.stats()
+        lines.append(_line('bookstore_catalogue_index_books', stats['books']))
+        lines.append(_line('bookstore_catalogue_index_authors', stats['authors']))
+    if catalogue.ready:
+        stats = catalogue.stats()
+        lines.append(_line('bookstore_catalogue_books', stats['books']))
+        lines.append(_line('bookstore_catalogue_available_books', stats['available']))
+        if 'bytes' in stats:
+            lines.append(_line('bookstore_catalogue_file_bytes', stats['bytes']))
+    return '\n'.join(line for line in lines if line is not None) + '\n'
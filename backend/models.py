@@ -1,4 +1,15 @@
-from db import execute_query
+import threading
+import time
+from mysql.connector import Error as MySQLError, errorcode
+from db import execute_query, stream_query, transaction
+from cache import cache, search_words, invalidate_book
+from config import Config
+from invalidation import publish_book_change, subscribe
+from search_index import search_index
+from suggest_index import suggest_index
+from catalogue_index import catalogue_index
+from catalogue import catalogue
+from projection import project
 
 #user functions
 def create_user(username, email, password_hash, role='customer'):
@@ -21,35 +32,247 @@ def get_user_by_id(user_id):
     return execute_query(query, (user_id,), fetch_one=True)
 
 #book functions
-def get_all_books():
-    query = "SELECT * FROM books WHERE available = TRUE ORDER BY title"
-    return execute_query(query, fetch_all=True)
 
-def get_all_books_for_manager():
-    #gets all books even unavailable
-    query = "SELECT * FROM books ORDER BY title"
-    return execute_query(query, fetch_all=True)
+#keeps IN lists (and packets) a sensible size
+BOOK_ID_CHUNK = 500
 
-def search_books(keyword):
-    query = """
-        SELECT * FROM books 
-        WHERE available = TRUE 
-        AND (title LIKE %s OR author LIKE %s)
-        ORDER BY title
-    """
-    search_term = f"%{keyword}%"
-    return execute_query(query, (search_term, search_term), fetch_all=True)
+#columns a fields= projection may ask for
+BOOK_FIELDS = ('id', 'title', 'author', 'price_buy', 'price_rent', 'available', 'created_at', 'updated_at')
+
+def _book_columns(fields, *extra):
+    #SELECT list for a projection (None = every column), extra are columns the query itself needs
+    #names only ever come from BOOK_FIELDS/BOOK_SORTS
+    if fields is None:
+        return "*"
+    return ", ".join(dict.fromkeys(fields + extra))
+
+def get_all_books(fields=None):
+    if catalogue.ready:
+        return [project(book, fields) for book in catalogue.page('title')]
+    query = f"SELECT {_book_columns(fields)} FROM books WHERE available = TRUE ORDER BY title"
+    #projections are free-form, keep them out of the prepared statement cache
+    return execute_query(query, fetch_all=True, prepared=fields is None)
+
+def stream_all_books_for_manager(fields=None):
+    #all books even unavailable, in batches
+    query = f"SELECT {_book_columns(fields)} FROM books ORDER BY title"
+    return stream_query(query)
+
+#mode name -> MATCH ... AGAINST modifier
+SEARCH_MODES = {
+    'boolean': 'BOOLEAN MODE',
+    'natural': 'NATURAL LANGUAGE MODE'
+}
+
+#InnoDB's default full text stopwords (INFORMATION_SCHEMA.INNODB_FT_DEFAULT_STOPWORD),
+#they are never indexed so "+the*" would match nothing at all
+FULLTEXT_STOPWORDS = frozenset((
+    'a', 'about', 'an', 'are', 'as', 'at', 'be', 'by', 'com', 'de', 'en', 'for',
+    'from', 'how', 'i', 'in', 'is', 'it', 'la', 'of', 'on', 'or', 'that', 'the',
+    'this', 'to', 'was', 'what', 'when', 'where', 'who', 'will', 'with', 'und', 'www'
+))
+
+#set once MySQL reports there is no ft_title_author index
+_fulltext_missing = []
+
+def _fulltext_against(keyword, mode):
+    #AGAINST text for the ft_title_author index, None when the LIKE path should be used
+    #boolean: "dune herb" -> "+dune* +herb*", every word required and matched as a prefix
+    #natural: the words as they are, any of them may match, ranked by relevance
+    #words below the server's minimum token size and stopwords never match, so they are dropped
+    if Config.SEARCH_ENGINE != 'fulltext' or _fulltext_missing:
+        return None
+    words = [word for word in search_words(keyword)
+             if word.isalnum() and len(word) >= Config.SEARCH_MIN_WORD_LENGTH
+             and word not in FULLTEXT_STOPWORDS]
+    if not words:
+        return None
+    if mode == 'natural':
+        return ' '.join(words)
+    return ' '.join(f'+{word}*' for word in words)
+
+def _trigram_search(keyword):
+    #ids from the in-memory index, None when it isn't in use (or not built yet)
+    if Config.SEARCH_ENGINE != 'trigram' or not search_index.ready:
+        return None
+    return search_index.search(keyword, Config.SEARCH_FUZZY_SIMILARITY, Config.SEARCH_FUZZY_LIMIT)
+
+def _catalogue_match(keyword, mode):
+    #test on a book row for searches the catalogue snapshot can answer itself,
+    #None when MySQL has to (full text ranking) or the snapshot isn't loaded
+    if not catalogue.ready:
+        return None
+    ids = _trigram_search(keyword)
+    if ids is not None:
+        ids = set(ids)
+        return lambda book: book['id'] in ids
+    if _fulltext_against(keyword, mode) is not None:
+        return None
+    #same rows as the LIKE '%keyword%' scan
+    term = keyword.lower()
+    return lambda book: term in book['title'].lower() or term in book['author'].lower()
+
+def _search_condition(keyword, mode):
+    #WHERE part and params matching keyword in title or author, whether the
+    #condition doubles as a relevance score and whether its sql text is fixed
+    ids = _trigram_search(keyword)
+    if ids is not None and len(ids) <= Config.SEARCH_ID_LIST_MAX:
+        if not ids:
+            return "FALSE", [], False, True
+        return f"id IN ({', '.join(['%s'] * len(ids))})", ids, False, False
+    #too many ids for an IN list, such a broad term stops early on the LIKE scan anyway
+    against = _fulltext_against(keyword, mode)
+    if against is None:
+        search_term = f"%{keyword}%"
+        return "(title LIKE %s OR author LIKE %s)", [search_term, search_term], False, True
+    return f"MATCH(title, author) AGAINST (%s IN {SEARCH_MODES[mode]})", [against], True, True
+
+def _searching(run):
+    #run() sends a search query, on a database that hasn't had
+    #database/migrations/003_books_fulltext.sql yet MySQL answers 1191 and
+    #this worker switches to the LIKE scan until it is restarted
+    try:
+        return run()
+    except MySQLError as e:
+        if e.errno != errorcode.ER_FT_MATCHING_KEY_NOT_FOUND or _fulltext_missing:
+            raise
+        print("No FULLTEXT index on books, searching with LIKE instead")
+        _fulltext_missing.append(True)
+        return run()
+
+def search_books(keyword, fields=None, mode='boolean'):
+    #full text matches come back best first, the LIKE fallback by title
+    #with the trigram index the rows are fetched by id in the index's order
+    ids = _trigram_search(keyword)
+    if ids is not None:
+        books = get_books_by_ids(ids)
+        return [project(books[book_id], fields) for book_id in ids
+                if book_id in books and books[book_id]['available']]
+    
+    match = _catalogue_match(keyword, mode)
+    if match is not None:
+        return [project(book, fields) for book in catalogue.page('title', match=match)]
+    
+    def run():
+        condition, params, ranked, fixed = _search_condition(keyword, mode)
+        order = "title"
+        if ranked:
+            order = f"{condition} DESC, title"
+            params = params * 2
+        query = f"""
+            SELECT {_book_columns(fields)} FROM books 
+            WHERE available = TRUE 
+            AND {condition}
+            ORDER BY {order}
+        """
+        return execute_query(query, tuple(params), fetch_all=True, prepared=fields is None)
+    
+    return _searching(run)
+
+#sort name -> column for paged book lists, each has an (available, column, id) index
+BOOK_SORTS = {
+    'title': 'title',
+    'author': 'author',
+    'price': 'price_buy'
+}
+
+def get_books_page(limit, sort='title', descending=False, after=None, keyword='', fields=None, mode='boolean'):
+    #one page of available books (optionally matching keyword) ordered by sort then id
+    #after is the (sort value, id) of the last book on the previous page
+    #with fields the rows also carry the sort column, the caller needs it for the cursor
+    column = BOOK_SORTS[sort]
+    if catalogue.ready:
+        match = _catalogue_match(keyword, mode) if keyword else None
+        if match is not None or not keyword:
+            with_sort = None if fields is None else tuple(dict.fromkeys(fields + (column,)))
+            books = catalogue.page(column, limit, descending, after, match)
+            return [project(book, with_sort) for book in books]
+    direction = 'DESC' if descending else 'ASC'
+    op = '<' if descending else '>'
+    
+    def run():
+        conditions = ["available = TRUE"]
+        params = []
+        prepared = fields is None
+        if keyword:
+            #pages keep their sort order, relevance only ranks the unpaged search
+            condition, search_params, ranked, fixed = _search_condition(keyword, mode)
+            conditions.append(condition)
+            params.extend(search_params)
+            prepared = prepared and fixed
+        if after:
+            value, book_id = after
+            conditions.append(f"({column} {op} %s OR ({column} = %s AND id {op} %s))")
+            params.extend([value, value, book_id])
+        query = f"""
+            SELECT {_book_columns(fields, column)} FROM books
+            WHERE {' AND '.join(conditions)}
+            ORDER BY {column} {direction}, id {direction}
+            LIMIT %s
+        """
+        return execute_query(query, tuple(params) + (limit,), fetch_all=True, prepared=prepared)
+    
+    return _searching(run)
+
+def filter_books(limit, price='buy', min_price=None, max_price=None, author=None, available=True,
+                 keyword='', sort='title', descending=False, after=None, fields=None):
+    #one page of a filtered listing, matched and ordered by the catalogue index
+    #returns (books, (sort value, id) to continue after or None, total matches)
+    ids, last, total = catalogue_index.query(
+        price, min_price, max_price, author, available, keyword, sort, descending, after, limit
+    )
+    found = get_books_by_ids(ids)
+    books = [project(found[book_id], fields) for book_id in ids if book_id in found]
+    return books, last, total
 
 def get_book_by_id(book_id):
+    #read through the cache, missing ids are cached as False for a short time
+    if catalogue.ready:
+        return catalogue.get(book_id)
     query = "SELECT * FROM books WHERE id = %s"
-    return execute_query(query, (book_id,), fetch_one=True)
+    book = cache.get_or_load(
+        f"book:{book_id}",
+        lambda: execute_query(query, (book_id,), fetch_one=True) or False,
+        ttl_seconds=lambda book: Config.BOOK_CACHE_TTL if book else Config.BOOK_NOT_FOUND_TTL,
+        tags=[f"book:{book_id}"]
+    )
+    #callers change the dict, keep the cached one intact
+    return dict(book) if book else None
+
+def get_books_by_ids(book_ids):
+    #several books at once, returns {id: book}
+    #cached books are used as they are, the rest come from IN queries of up to BOOK_ID_CHUNK ids
+    if catalogue.ready:
+        return catalogue.get_many(book_ids)
+    ids = list(set(book_ids))
+    cached = cache.get_many([f"book:{book_id}" for book_id in ids])
+    
+    books = {}
+    missing = []
+    for book_id in ids:
+        book = cached.get(f"book:{book_id}")
+        if book is None:
+            missing.append(book_id)
+        elif book:
+            books[book_id] = dict(book)
+    
+    for start in range(0, len(missing), BOOK_ID_CHUNK):
+        chunk = missing[start:start + BOOK_ID_CHUNK]
+        placeholders = ', '.join(['%s'] * len(chunk))
+        query = f"SELECT * FROM books WHERE id IN ({placeholders})"
+        for row in execute_query(query, tuple(chunk), fetch_all=True, prepared=False):
+            books[row['id']] = row
+    
+    return books
 
 def create_book(title, author, price_buy, price_rent):
     query = """
         INSERT INTO books (title, author, price_buy, price_rent)
         VALUES (%s, %s, %s, %s)
     """
-    return execute_query(query, (title, author, price_buy, price_rent), commit=True)
+    book_id = execute_query(query, (title, author, price_buy, price_rent), commit=True)
+    publish_book_change(book_id, title, author)
+    return book_id
 
 def update_book(book_id, title, author, price_buy, price_rent, available):
     query = """
@@ -57,22 +280,153 @@ def update_book(book_id, title, author, price_buy, price_rent, available):
         SET title = %s, author = %s, price_buy = %s, price_rent = %s, available = %s
         WHERE id = %s
     """
-    return execute_query(query, (title, author, price_buy, price_rent, available, book_id), commit=True)
+    result = execute_query(query, (title, author, price_buy, price_rent, available, book_id), commit=True)
+    publish_book_change(book_id, title, author)
+    return result
 
-#order functions
-def create_order(user_id, total_amount):
-    query = """
-        INSERT INTO orders (user_id, total_amount)
-        VALUES (%s, %s)
-    """
-    return execute_query(query, (user_id, total_amount), commit=True)
+def _index_row(book_id):
+    #book changes only carry title and author, the indexes need the rest of the row
+    query = "SELECT * FROM books WHERE id = %s"
+    return execute_query(query, (book_id,), fetch_one=True)
 
-def create_order_item(order_id, book_id, item_type, price):
-    query = """
-        INSERT INTO order_items (order_id, book_id, item_type, price)
-        VALUES (%s, %s, %s, %s)
-    """
-    return execute_query(query, (order_id, book_id, item_type, price), commit=True)
+def _book_indexes():
+    return [index for index in (search_index, suggest_index, catalogue_index, catalogue) if index.ready]
+
+def _index(book_id, book, indexes):
+    #brings the given indexes up to date with book, None when it is gone
+    for index in indexes:
+        if not book:
+            index.remove(book_id)
+        elif index is catalogue:
+            index.upsert(book)
+        elif index is catalogue_index:
+            index.upsert(book['id'], book['title'], book['author'],
+                         book['price_buy'], book['price_rent'], book['available'])
+        else:
+            index.upsert(book['id'], book['title'], book['author'], book['available'])
+
+def index_book(book_id, *texts):
+    #subscribed to book changes once the first in-memory index is built,
+    #reads the row once and brings every built index up to date
+    indexes = _book_indexes()
+    if not indexes:
+        return
+    _index(book_id, _index_row(book_id), indexes)
+    #the cache was cleared before the indexes caught up, anything reloaded
+    #from them in between is dropped again
+    invalidate_book(book_id, *texts)
+
+_indexing = []
+
+def _subscribe_index_book():
+    if not _indexing:
+        _indexing.append(True)
+        subscribe(index_book)
+
+def _index_rows(fields):
+    #streamed so the whole catalogue is never held as rows at once
+    return (row for batch in stream_all_books_for_manager(fields) for row in batch)
+
+def load_search_index():
+    #builds this worker's trigram index and keeps it current, call once at startup
+    search_index.build(_index_rows(('id', 'title', 'author', 'available')))
+    _subscribe_index_book()
+
+def load_catalogue_index():
+    #builds this worker's price/author index and keeps it current, call once at startup
+    catalogue_index.build(_index_rows(('id', 'title', 'author', 'price_buy', 'price_rent', 'available')))
+    _subscribe_index_book()
+
+def load_catalogue():
+    #loads the whole books table into this worker and keeps it current, call once at startup
+    #a snapshot file left by an earlier run is reconciled before it serves anything
+    catalogue.load(lambda: _index_rows(None), lambda: reconcile_catalogue([catalogue]))
+    if not catalogue.ready:
+        return
+    _subscribe_index_book()
+    threading.Thread(target=_reconcile_catalogue, name='catalogue-reconcile', daemon=True).start()
+
+def reconcile_catalogue(indexes=None):
+    #catches up on changes the invalidation bus never delivered (a worker that was
+    #restarting, edits made straight in MySQL), returns how many books changed
+    #indexes defaults to every built one
+    if indexes is None:
+        indexes = _book_indexes()
+    changed = 0
+    query = "SELECT * FROM books WHERE updated_at >= %s"
+    #>= since updated_at only has whole seconds, rows already seen compare equal
+    #an empty table has no updated_at yet, TIMESTAMP starts at 1970
+    since = catalogue.updated_at or '1970-01-01 00:00:00'
+    for book in execute_query(query, (since,), fetch_all=True):
+        if catalogue.get(book['id']) != book:
+            _index(book['id'], book, indexes)
+            invalidate_book(book['id'], book['title'], book['author'])
+            changed += 1
+    
+    #deleted rows leave no updated_at behind, the ids have to be compared
+    count = execute_query("SELECT COUNT(*) AS books FROM books", fetch_one=True)['books']
+    if count != catalogue.stats()['books']:
+        ids = {row['id'] for row in execute_query("SELECT id FROM books", fetch_all=True)}
+        for book_id in catalogue.ids() - ids:
+            _index(book_id, None, indexes)
+            invalidate_book(book_id)
+            changed += 1
+        for book_id in ids - catalogue.ids():
+            book = _index_row(book_id)
+            if book:
+                _index(book_id, book, indexes)
+                invalidate_book(book_id, book['title'], book['author'])
+                changed += 1
+    return changed
+
+def _reconcile_catalogue():
+    while True:
+        time.sleep(Config.CATALOGUE_RECONCILE_SECONDS)
+        try:
+            reconcile_catalogue()
+        except Exception as e:
+            print(f"Failed to reconcile the catalogue: {e}")
+
+def get_book_popularity():
+    #{book id: copies ordered}, idx_book_id covers this
+    query = "SELECT book_id, COUNT(*) AS ordered FROM order_items GROUP BY book_id"
+    return {row['book_id']: row['ordered'] for row in execute_query(query, fetch_all=True)}
+
+def _reload_popularity():
+    #orders taken by other workers only show up here
+    while True:
+        time.sleep(Config.SUGGEST_POPULARITY_REFRESH)
+        try:
+            suggest_index.set_popularity(get_book_popularity())
+        except Exception as e:
+            print(f"Failed to reload book popularity: {e}")
+
+def load_suggest_index():
+    #builds this worker's autocomplete index and keeps it current, call once at startup
+    suggest_index.build(_index_rows(('id', 'title', 'author', 'available')), get_book_popularity())
+    _subscribe_index_book()
+    threading.Thread(target=_reload_popularity, name='suggest-popularity', daemon=True).start()
+
+#order functions
+def create_order_with_items(user_id, total_amount, items):
+    #order and all of its items in one transaction, nothing is left behind on failure
+    with transaction() as cursor:
+        cursor.execute(
+            "INSERT INTO orders (user_id, total_amount) VALUES (%s, %s)",
+            (user_id, total_amount)
+        )
+        order_id = cursor.lastrowid
+        #executemany turns this into one multi-row INSERT
+        cursor.executemany(
+            """
+            INSERT INTO order_items (order_id, book_id, item_type, price)
+            VALUES (%s, %s, %s, %s)
+            """,
+            [(order_id, item['book_id'], item['type'], item['price']) for item in items]
+        )
+    if suggest_index.ready:
+        suggest_index.record_orders(item['book_id'] for item in items)
+    return order_id
 
 def get_order_by_id(order_id):
     query = """
@@ -84,22 +438,87 @@ def get_order_by_id(order_id):
     return execute_query(query, (order_id,), fetch_one=True)
 
 def get_order_items(order_id):
-    query = """
-        SELECT oi.*, b.title, b.author
-        FROM order_items oi
-        JOIN books b ON oi.book_id = b.id
-        WHERE oi.order_id = %s
+    query = "SELECT * FROM order_items WHERE order_id = %s"
+    items = execute_query(query, (order_id,), fetch_all=True)
+    
+    #titles and authors come from the book cache instead of a join
+    books = get_books_by_ids(item['book_id'] for item in items)
+    for item in items:
+        book = books.get(item['book_id'], {})
+        item['title'] = book.get('title')
+        item['author'] = book.get('author')
+    return items
+
+#fields= name -> column for manager order lists, users is only joined when needed
+ORDER_COLUMNS = {
+    'id': 'o.id',
+    'user_id': 'o.user_id',
+    'total_amount': 'o.total_amount',
+    'payment_status': 'o.payment_status',
+    'created_at': 'o.created_at',
+    'username': 'u.username',
+    'email': 'u.email'
+}
+ORDER_FIELDS = tuple(ORDER_COLUMNS)
+
+def _order_select(fields, *extra):
+    #SELECT list and FROM clause for a projection (None = every column)
+    if fields is None:
+        return "o.*, u.username, u.email", "orders o JOIN users u ON o.user_id = u.id"
+    fields = tuple(dict.fromkeys(fields + extra))
+    columns = ", ".join(ORDER_COLUMNS[field] for field in fields)
+    if 'username' in fields or 'email' in fields:
+        return columns, "orders o JOIN users u ON o.user_id = u.id"
+    return columns, "orders o"
+
+def _order_conditions(payment_status=None, date_from=None, date_to=None):
+    #WHERE parts for the manager order filters, date_to is exclusive
+    conditions = []
+    params = []
+    if payment_status:
+        conditions.append("o.payment_status = %s")
+        params.append(payment_status)
+    if date_from:
+        conditions.append("o.created_at >= %s")
+        params.append(date_from)
+    if date_to:
+        conditions.append("o.created_at < %s")
+        params.append(date_to)
+    return conditions, params
+
+def stream_all_orders(payment_status=None, date_from=None, date_to=None, fields=None):
+    #all orders with the customer's username and email, newest first,
+    #optionally filtered, in batches
+    conditions, params = _order_conditions(payment_status, date_from, date_to)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    columns, tables = _order_select(fields)
+    query = f"""
+        SELECT {columns}
+        FROM {tables}
+        {where}
+        ORDER BY o.created_at DESC, o.id DESC
     """
-    return execute_query(query, (order_id,), fetch_all=True)
+    return stream_query(query, tuple(params))
 
-def get_all_orders():
-    query = """
-        SELECT o.*, u.username, u.email 
-        FROM orders o
-        JOIN users u ON o.user_id = u.id
-        ORDER BY o.created_at DESC
+def get_orders_page(limit, after=None, payment_status=None, date_from=None, date_to=None, fields=None):
+    #newest first, keyset on (created_at, id) so every page is an index range scan
+    #after is the (created_at, id) of the last order on the previous page
+    #with fields the rows also carry created_at, the caller needs it for the cursor
+    conditions, params = _order_conditions(payment_status, date_from, date_to)
+    if after:
+        created_at, order_id = after
+        conditions.append("o.created_at <= %s AND (o.created_at < %s OR o.id < %s)")
+        params.extend([created_at, created_at, order_id])
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    columns, tables = _order_select(fields, 'created_at')
+    query = f"""
+        SELECT {columns}
+        FROM {tables}
+        {where}
+        ORDER BY o.created_at DESC, o.id DESC
+        LIMIT %s
     """
-    return execute_query(query, fetch_all=True)
+    return execute_query(query, tuple(params) + (limit,), fetch_all=True, prepared=fields is None)
 
 def update_order_payment_status(order_id, payment_status):
     query = "UPDATE orders SET payment_status = %s WHERE id = %s"
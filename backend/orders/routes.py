@@ -1,11 +1,12 @@
 from flask import Blueprint, request, jsonify
 from auth.routes import login_required
 from models import (
-    create_order, create_order_item, get_order_by_id, 
-    get_order_items, get_book_by_id, get_user_by_id
+    create_order_with_items, get_order_by_id,
+    get_order_items, get_books_by_ids, get_user_by_id
 )
 from email_service import send_order_bill
 from datetime import datetime
+from db import PoolExhausted, release_connection
 
 orders_bp = Blueprint('orders', __name__, url_prefix='/api/orders')
 
@@ -27,13 +28,23 @@ def create_new_order():
         if 'book_id' not in item or 'type' not in item:
             return jsonify({'error': 'Invalid item structure'}), 400
         
-        book_id = item['book_id']
         item_type = item['type'].lower()
         
         if item_type not in ['buy', 'rent']:
             return jsonify({'error': f'Invalid item type: {item_type}. Must be "buy" or "rent"'}), 400
+    
+    try:
+        book_ids = [int(item['book_id']) for item in items]
+    except (ValueError, TypeError):
+        return jsonify({'error': 'Invalid item structure'}), 400
+    
+    #all books in one query instead of one per item
+    books = get_books_by_ids(book_ids)
+    
+    for item, book_id in zip(items, book_ids):
+        item_type = item['type'].lower()
         
-        book = get_book_by_id(book_id)
+        book = books.get(book_id)
         if not book:
             return jsonify({'error': f'Book with ID {book_id} not found'}), 404
         
@@ -52,15 +63,7 @@ def create_new_order():
         })
     
     try:
-        order_id = create_order(user_id, total_amount)
-        
-        for item in order_items:
-            create_order_item(
-                order_id,
-                item['book_id'],
-                item['type'],
-                item['price']
-            )
+        order_id = create_order_with_items(user_id, total_amount, order_items)
         
         user = get_user_by_id(user_id)
         
@@ -73,6 +76,8 @@ def create_new_order():
             'created_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
         }
         
+        #that was the last query, don't hold a pool slot through the smtp round trips
+        release_connection()
         email_sent = send_order_bill(user['email'], order_data)
         
         return jsonify({
@@ -84,6 +89,8 @@ def create_new_order():
             'message': 'Order created successfully' + (' (email sent)' if email_sent else ' (email failed - check SMTP config)')
         }), 201
         
+    except PoolExhausted:
+        raise
     except Exception as e:
         return jsonify({'error': f'Failed to create order: {str(e)}'}), 500
 
@@ -111,5 +118,7 @@ def get_order(order_id):
             'items': items
         }), 200
         
+    except PoolExhausted:
+        raise
     except Exception as e:
         return jsonify({'error': f'Failed to retrieve order: {str(e)}'}), 500
@@ -0,0 +1,56 @@
+import base64
+import json
+from datetime import datetime
+from decimal import Decimal
+
+#keyset pagination helpers: a cursor is the sort key of the last row sent,
+#opaque to clients (base64 json)
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 500
+
+def _encode_value(value):
+    if isinstance(value, datetime):
+        return {'dt': value.isoformat()}
+    if isinstance(value, Decimal):
+        return {'dec': str(value)}
+    return value
+
+def _decode_value(value):
+    if isinstance(value, dict):
+        try:
+            if 'dt' in value:
+                return datetime.fromisoformat(value['dt'])
+            if 'dec' in value:
+                return Decimal(value['dec'])
+        except (ValueError, TypeError, ArithmeticError):
+            pass
+        raise ValueError('Invalid cursor')
+    return value
+
+def encode_cursor(*values):
+    text = json.dumps([_encode_value(value) for value in values], separators=(',', ':'))
+    return base64.urlsafe_b64encode(text.encode('utf-8')).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor, size):
+    #raises ValueError for anything we didn't hand out
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (ValueError, TypeError):
+        raise ValueError('Invalid cursor')
+    if not isinstance(values, list) or len(values) != size:
+        raise ValueError('Invalid cursor')
+    return [_decode_value(value) for value in values]
+
+def parse_limit(value):
+    if value is None:
+        return DEFAULT_LIMIT
+    limit = int(value)
+    if limit < 1 or limit > MAX_LIMIT:
+        raise ValueError(f'limit must be between 1 and {MAX_LIMIT}')
+    return limit
+
+def parse_datetime(value):
+    #accepts YYYY-MM-DD or a full ISO timestamp
+    return datetime.fromisoformat(value) if value else None
@@ -0,0 +1,23 @@
+#fields= projection helpers, names are checked against a whitelist before
+#they get anywhere near the sql
+
+def parse_fields(value, allowed):
+    #"title,price_buy" -> ('id', 'title', 'price_buy'), None when every field is wanted
+    #id is always included, the order follows allowed so equal projections compare equal
+    if not value:
+        return None
+    fields = [field.strip() for field in value.split(',') if field.strip()]
+    unknown = [field for field in fields if field not in allowed]
+    if unknown:
+        raise ValueError(f'Unknown fields: {", ".join(unknown)}. Allowed: {", ".join(allowed)}')
+    wanted = set(fields) | {'id'}
+    return tuple(field for field in allowed if field in wanted)
+
+def fields_key(fields):
+    #cache key part for a projection
+    return ','.join(fields) if fields else '*'
+
+def project(row, fields):
+    if fields is None:
+        return row
+    return {field: row[field] for field in fields}
@@ -0,0 +1,175 @@
+import pickle
+import time
+import redis
+from cache import BaseCache
+
+class RedisCache(BaseCache):
+    #cache shared by every worker through redis (or anything speaking its protocol)
+    #values are pickled as (value, fresh_until, tags), redis expires them at the hard ttl
+    #GENERATION_KEY is bumped by every invalidation from any worker, a load only
+    #stores its value if it didn't move in the meantime
+    #tags starting with one of INDEXED_TAG_PREFIXES are also listed in a set per
+    #prefix, so tags_with_prefix doesn't have to scan the keyspace
+
+    KEY_PREFIX = 'cache:'
+    TAG_PREFIX = 'cache-tag:'
+    TAG_INDEX_PREFIX = 'cache-tags:'
+    GENERATION_KEY = 'cache-generation'
+    INDEXED_TAG_PREFIXES = ('term:',)
+
+    def __init__(self, client, load_timeout=5, refresh_workers=2):
+        super().__init__(load_timeout, refresh_workers)
+        self.client = client
+
+    @classmethod
+    def from_url(cls, url, **kwargs):
+        return cls(redis.Redis.from_url(url), **kwargs)
+
+    def set(self, key, value, ttl_seconds=60, tags=(), stale_seconds=0):
+        pipe = self.client.pipeline(transaction=False)
+        self._queue_set(pipe, key, value, ttl_seconds, tags, stale_seconds)
+        pipe.execute()
+
+    def _queue_set(self, pipe, key, value, ttl_seconds, tags, stale_seconds):
+        tags = frozenset(tags)
+        hard_ttl = max(1, int(ttl_seconds + stale_seconds + 0.999))
+        payload = pickle.dumps((value, time.time() + ttl_seconds, tags), pickle.HIGHEST_PROTOCOL)
+
+        pipe.set(self.KEY_PREFIX + key, payload, ex=hard_ttl)
+        for tag in tags:
+            #tag sets (and the indexes listing them) live at least as long as their longest entry
+            members = [(self.TAG_PREFIX + tag, key)]
+            index = self._tag_index(tag)
+            if index is not None:
+                members.append((index, tag))
+            for set_key, member in members:
+                pipe.sadd(set_key, member)
+                pipe.expire(set_key, hard_ttl, nx=True)
+                pipe.expire(set_key, hard_ttl, gt=True)
+
+    def _tag_index(self, tag):
+        for prefix in self.INDEXED_TAG_PREFIXES:
+            if tag.startswith(prefix):
+                return self.TAG_INDEX_PREFIX + prefix
+        return None
+
+    def _current_generation(self, client=None):
+        return int((client or self.client).get(self.GENERATION_KEY) or 0)
+
+    def _set_if_current(self, generation, key, value, ttl_seconds, tags, stale_seconds):
+        #WATCH makes the write fail if another worker invalidates between the check and EXEC
+        with self.client.pipeline() as pipe:
+            try:
+                pipe.watch(self.GENERATION_KEY)
+                if self._current_generation(pipe) != generation:
+                    return False
+                pipe.multi()
+                self._queue_set(pipe, key, value, ttl_seconds, tags, stale_seconds)
+                pipe.execute()
+                return True
+            except redis.WatchError:
+                return False
+
+    def get_many(self, keys):
+        #one round trip for all keys
+        keys = list(keys)
+        if not keys:
+            return {}
+        payloads = self.client.mget([self.KEY_PREFIX + key for key in keys])
+        now = time.time()
+        found = {}
+        for key, payload in zip(keys, payloads):
+            if payload is not None:
+                value, fresh_until, tags = pickle.loads(payload)
+                if now < fresh_until:
+                    found[key] = value
+        self._count_many(keys, found)
+        return found
+
+    def delete(self, key):
+        #the generation moves before anything is dropped, so a load that read the
+        #old one either fails its check or has its value deleted here
+        self._invalidated()
+        pipe = self.client.pipeline(transaction=False)
+        pipe.incr(self.GENERATION_KEY)
+        pipe.delete(self.KEY_PREFIX + key)
+        pipe.execute()
+
+    def invalidate_tags(self, *tags):
+        self._invalidated()
+        if not tags:
+            return 0
+        pipe = self.client.pipeline(transaction=False)
+        pipe.incr(self.GENERATION_KEY)
+        for tag in tags:
+            pipe.smembers(self.TAG_PREFIX + tag)
+        keys = set()
+        for members in pipe.execute()[1:]:
+            keys.update(members)
+
+        pipe = self.client.pipeline(transaction=False)
+        if keys:
+            pipe.delete(*[self.KEY_PREFIX.encode() + key for key in keys])
+        pipe.delete(*[self.TAG_PREFIX + tag for tag in tags])
+        for tag in tags:
+            index = self._tag_index(tag)
+            if index is not None:
+                pipe.srem(index, tag)
+        pipe.execute()
+        return len(keys)
+
+    def tags_with_prefix(self, prefix):
+        index = self._tag_index(prefix)
+        if index is not None:
+            return [tag.decode() for tag in self.client.smembers(index)
+                    if tag.decode().startswith(prefix)]
+        #anything else has to be found by scanning
+        start = len(self.TAG_PREFIX)
+        return [
+            tag.decode()[start:]
+            for tag in self.client.scan_iter(match=self.TAG_PREFIX + prefix + '*', count=500)
+        ]
+
+    def clear(self):
+        self._invalidated()
+        self.client.incr(self.GENERATION_KEY)
+        for pattern in (self.KEY_PREFIX + '*', self.TAG_PREFIX + '*', self.TAG_INDEX_PREFIX + '*'):
+            batch = []
+            for key in self.client.scan_iter(match=pattern, count=500):
+                batch.append(key)
+                if len(batch) >= 500:
+                    self.client.delete(*batch)
+                    batch = []
+            if batch:
+                self.client.delete(*batch)
+
+    def stats(self):
+        stats = {
+            'backend': 'redis',
+            'keys': self.client.dbsize(),
+            'namespaces': self._namespace_stats()
+        }
+        try:
+            info = self.client.info()
+        except redis.ResponseError:
+            #stand-ins like fakeredis don't implement INFO
+            return stats
+        stats.update({
+            'bytes': info.get('used_memory'),
+            'evictions': info.get('evicted_keys'),
+            'expirations': info.get('expired_keys')
+        })
+        return stats
+
+    def peek_tagged(self, key):
+        #(value, fresh, tags) so a local tier can keep the tags
+        payload = self.client.get(self.KEY_PREFIX + key)
+        if payload is None:
+            return None, False, frozenset()
+        value, fresh_until, tags = pickle.loads(payload)
+        return value, time.time() < fresh_until, tags
+
+    def _peek(self, key, stale_hit=True):
+        value, fresh, tags = self.peek_tagged(key)
+        self.metrics.record(key, self._lookup_field(value, fresh, stale_hit))
+        return value, fresh
@@ -0,0 +1,88 @@
+import gzip
+import hashlib
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from itertools import chain
+from flask import Response, request, stream_with_context
+from werkzeug.http import http_date
+
+#bodies smaller than this aren't worth compressing
+GZIP_MIN_BYTES = 1024
+
+def _default(value):
+    #same output jsonify gave us after the manual float conversions
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (datetime, date)):
+        return http_date(value)
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+class CachedResponse:
+    #an encoded JSON body that can be cached and sent as is
+
+    __slots__ = ('body', 'gzipped', 'etag', 'tags')
+
+    def __init__(self, body, tags=()):
+        self.body = body
+        self.gzipped = gzip.compress(body, compresslevel=6) if len(body) >= GZIP_MIN_BYTES else None
+        self.etag = hashlib.md5(body).hexdigest()
+        self.tags = frozenset(tags)
+
+    def __sizeof__(self):
+        return object.__sizeof__(self) + len(self.body) + len(self.gzipped or b'')
+
+def encode_response(payload, tags=()):
+    body = json.dumps(payload, default=_default, separators=(',', ':')).encode('utf-8')
+    return CachedResponse(body, tags)
+
+def send_response(cached, status=200, hit=False):
+    #builds the flask response, no per-row work happens here
+    if request.if_none_match.contains(cached.etag):
+        response = Response(status=304)
+    elif cached.gzipped is not None and 'gzip' in request.accept_encodings:
+        response = Response(cached.gzipped, status=status, mimetype='application/json')
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        response = Response(cached.body, status=status, mimetype='application/json')
+
+    response.set_etag(cached.etag)
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.headers['X-Cache'] = 'HIT' if hit else 'MISS'
+    return response
+
+def wants_ndjson():
+    return (request.args.get('format') == 'ndjson' or
+            request.accept_mimetypes.best == 'application/x-ndjson')
+
+def stream_rows(name, batches):
+    #streams {"<name>": [...], "count": n} (or one row per line for ndjson)
+    #one batch at a time, memory stays flat however many rows there are
+    #the first batch is read here so query errors still reach the caller
+    first = next(batches, [])
+    ndjson = wants_ndjson()
+
+    def generate():
+        count = 0
+        try:
+            if not ndjson:
+                yield f'{{"{name}":['.encode('utf-8')
+            for batch in chain([first], batches):
+                if not batch:
+                    continue
+                if ndjson:
+                    lines = [json.dumps(row, default=_default, separators=(',', ':')) for row in batch]
+                    yield ('\n'.join(lines) + '\n').encode('utf-8')
+                else:
+                    body = json.dumps(batch, default=_default, separators=(',', ':'))[1:-1]
+                    yield ((',' if count else '') + body).encode('utf-8')
+                count += len(batch)
+            if not ndjson:
+                yield f'],"count":{count}}}'.encode('utf-8')
+        finally:
+            #client went away or we're done, give the connection back
+            if hasattr(batches, 'close'):
+                batches.close()
+
+    mimetype = 'application/x-ndjson' if ndjson else 'application/json'
+    return Response(stream_with_context(generate()), mimetype=mimetype)
@@ -0,0 +1,138 @@
+from array import array
+from collections import Counter
+import threading
+
+#in-memory trigram index over book titles and authors (SEARCH_ENGINE=trigram)
+#answers LIKE '%q%' style substring searches without a table scan, and ranks
+#near misses when nothing matches exactly
+
+EMPTY = array('I')
+
+def normalize(text):
+    return ' '.join(text.lower().split())
+
+def trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+def padded_trigrams(text):
+    #adds " ab" and "yz " style grams for the start and end of the text, a typo
+    #near either end then still leaves some grams in common
+    return trigrams(f' {text} ')
+
+class TrigramIndex:
+    #every indexed version of a book gets a slot number, posting lists are arrays
+    #of slots in ascending order so they only ever grow at the end
+    #an edit retires the book's old slot and appends a new one, retired slots
+    #are dropped by a rebuild once they make up a quarter of the index
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.ready = False
+        self._clear()
+
+    def _clear(self):
+        self._postings = {}
+        self._ids = array('I')
+        self._available = bytearray()
+        #"title\0author", None once the slot is retired
+        self._texts = []
+        self._slots = {}
+        self._retired = 0
+
+    def build(self, rows):
+        #rows need id, title, author and available
+        with self._lock:
+            self._clear()
+            for row in rows:
+                self._add(row['id'], row['title'], row['author'], row['available'])
+            self.ready = True
+
+    def upsert(self, book_id, title, author, available):
+        with self._lock:
+            self._retire(book_id)
+            self._add(book_id, title, author, available)
+            if self._retired > max(1000, len(self._slots) // 4):
+                self._compact()
+
+    def remove(self, book_id):
+        with self._lock:
+            self._retire(book_id)
+
+    def _add(self, book_id, title, author, available):
+        title = normalize(title)
+        author = normalize(author)
+        slot = len(self._ids)
+        self._ids.append(book_id)
+        self._available.append(1 if available else 0)
+        self._texts.append(f'{title}\0{author}')
+        self._slots[book_id] = slot
+        #padded grams are a superset of the plain ones, so both kinds of lookup work
+        for gram in padded_trigrams(title) | padded_trigrams(author):
+            postings = self._postings.get(gram)
+            if postings is None:
+                postings = self._postings[gram] = array('I')
+            postings.append(slot)
+
+    def _retire(self, book_id):
+        slot = self._slots.pop(book_id, None)
+        if slot is not None:
+            self._texts[slot] = None
+            self._available[slot] = 0
+            self._retired += 1
+
+    def _compact(self):
+        live = [(self._ids[slot], self._texts[slot], self._available[slot])
+                for slot in sorted(self._slots.values())]
+        self._clear()
+        for book_id, text, available in live:
+            title, author = text.split('\0')
+            self._add(book_id, title, author, available)
+
+    def search(self, query, fuzzy_similarity=0.3, fuzzy_limit=50):
+        #ids of available books whose title or author contains query, ordered by
+        #title then author; with no such book, the books sharing the most of the
+        #query's trigrams (at least fuzzy_similarity of them), best first
+        query = normalize(query)
+        if not query:
+            return []
+
+        with self._lock:
+            texts = self._texts
+            available = self._available
+
+            if len(query) < 3:
+                #too short for a trigram, look at every title
+                slots = [slot for slot, text in enumerate(texts)
+                         if text is not None and available[slot] and query in text]
+                return [self._ids[slot] for slot in sorted(slots, key=texts.__getitem__)]
+
+            grams = trigrams(query)
+            lists = sorted((self._postings.get(gram, EMPTY) for gram in grams), key=len)
+
+            #every match is in the shortest list, checking the text there is enough
+            slots = [slot for slot in lists[0]
+                     if available[slot] and query in texts[slot]]
+            if slots:
+                return [self._ids[slot] for slot in sorted(slots, key=texts.__getitem__)]
+
+            if not fuzzy_similarity:
+                return []
+            grams = padded_trigrams(query)
+            shared = Counter()
+            for gram in grams:
+                shared.update(self._postings.get(gram, EMPTY))
+            needed = max(2, len(grams) * fuzzy_similarity)
+            slots = [slot for slot, count in shared.items() if count >= needed and available[slot]]
+            slots.sort(key=lambda slot: (-shared[slot], texts[slot]))
+            return [self._ids[slot] for slot in slots[:fuzzy_limit]]
+
+    def stats(self):
+        with self._lock:
+            return {
+                'books': len(self._slots),
+                'retired_slots': self._retired,
+                'trigrams': len(self._postings),
+                'postings': sum(len(postings) for postings in self._postings.values())
+            }
+
+search_index = TrigramIndex()
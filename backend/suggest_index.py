@@ -0,0 +1,199 @@
+from bisect import bisect_left, insort
+import heapq
+import threading
+
+#prefix autocomplete over book titles and authors for GET /api/books/suggest
+#keys are kept in one sorted list, a prefix is the slice between two bisects
+
+#prefix ranges longer than this get their top suggestions remembered
+SCAN_LIMIT = 2000
+#most suggestions one request can ask for
+MAX_SUGGESTIONS = 20
+#remembered lists start this long, so they survive some removals before a rescan
+TOP_KEEP = 2 * MAX_SUGGESTIONS
+#prefixes this short are ranked up front at build time
+EAGER_PREFIX = 2
+
+def normalize(text):
+    return ' '.join(text.lower().split())
+
+class SuggestIndex:
+    #a key is "<normalized text>\0<title|author>", so a title and an author
+    #with the same text stay separate suggestions
+    #a key's score is the number of ordered copies of its available books
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.ready = False
+        self._clear()
+
+    def _clear(self):
+        self._keys = []
+        #key -> {'text', 'type', 'ids', 'score'}
+        self._entries = {}
+        #book id -> (title key, author key, available)
+        self._books = {}
+        self._popularity = {}
+        #prefix -> best keys in rank order, only for prefixes matching more than
+        #SCAN_LIMIT keys, kept up to date as scores change
+        self._top = {}
+
+    def build(self, rows, popularity):
+        #rows need id, title, author and available, popularity is {book id: times ordered}
+        with self._lock:
+            self._clear()
+            self._popularity = dict(popularity)
+            for row in rows:
+                self._add(row['id'], row['title'], row['author'], row['available'], sort=False)
+            self._keys.sort()
+            #the one and two letter prefixes are the slowest to rank, and
+            #the first thing anyone types
+            for length in range(1, EAGER_PREFIX + 1):
+                for prefix in sorted({key[:length] for key in self._keys if '\0' not in key[:length]}):
+                    self._ranked(prefix)
+            self.ready = True
+
+    def upsert(self, book_id, title, author, available):
+        with self._lock:
+            self._remove(book_id)
+            self._add(book_id, title, author, available)
+
+    def remove(self, book_id):
+        with self._lock:
+            self._remove(book_id)
+
+    def record_orders(self, book_ids):
+        #bumps popularity for books that were just ordered
+        with self._lock:
+            for book_id in book_ids:
+                self._popularity[book_id] = self._popularity.get(book_id, 0) + 1
+                self._change_score(book_id, 1)
+
+    def set_popularity(self, popularity):
+        #the periodic reload from order_items, only books whose count moved are touched
+        with self._lock:
+            for book_id in set(popularity) | set(self._popularity):
+                change = popularity.get(book_id, 0) - self._popularity.get(book_id, 0)
+                if change:
+                    self._popularity[book_id] = popularity.get(book_id, 0)
+                    self._change_score(book_id, change)
+
+    def _change_score(self, book_id, change):
+        book = self._books.get(book_id)
+        if book and book[2]:
+            for key in book[:2]:
+                self._entries[key]['score'] += change
+                if change > 0:
+                    self._raise(key)
+                else:
+                    self._lower(key)
+
+    def _add(self, book_id, title, author, available, sort=True):
+        keys = []
+        for text, kind in ((title, 'title'), (author, 'author')):
+            key = f'{normalize(text)}\0{kind}'
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = self._entries[key] = {'text': text.strip(), 'type': kind, 'ids': set(), 'score': 0}
+                if sort:
+                    insort(self._keys, key)
+                else:
+                    self._keys.append(key)
+            entry['ids'].add(book_id)
+            if available:
+                entry['score'] += self._popularity.get(book_id, 0)
+                self._raise(key)
+            keys.append(key)
+        self._books[book_id] = (keys[0], keys[1], bool(available))
+
+    def _remove(self, book_id):
+        book = self._books.pop(book_id, None)
+        if book is None:
+            return
+        title_key, author_key, available = book
+        for key in (title_key, author_key):
+            entry = self._entries[key]
+            entry['ids'].discard(book_id)
+            if available:
+                entry['score'] -= self._popularity.get(book_id, 0)
+            self._lower(key)
+            if not entry['ids']:
+                del self._entries[key]
+                del self._keys[bisect_left(self._keys, key)]
+
+    def _rank(self, key):
+        return (-self._entries[key]['score'], key)
+
+    def _remembered(self, key):
+        #(prefix, list) for the remembered lists whose prefix key starts with
+        text = key.split('\0')[0]
+        for end in range(1, len(text) + 1):
+            top = self._top.get(text[:end])
+            if top is not None:
+                yield text[:end], top
+
+    def _insert(self, top, key):
+        #puts key in rank order and drops whatever falls off the end
+        ranks = [self._rank(other) for other in top]
+        top.insert(bisect_left(ranks, self._rank(key)), key)
+        top.pop()
+
+    def _raise(self, key):
+        #key scores higher (or just became suggestable), the rest keep their order
+        #so at most one key drops off the end
+        for prefix, top in self._remembered(key):
+            if key in top:
+                top.sort(key=self._rank)
+            elif self._rank(key) < self._rank(top[-1]):
+                self._insert(top, key)
+
+    def _lower(self, key):
+        #key scores lower or is going away, a key that was never remembered could
+        #now beat it, so the list shrinks by one and is rebuilt once it gets short
+        for prefix, top in list(self._remembered(key)):
+            if key not in top:
+                continue
+            top.remove(key)
+            if self._has_available(self._entries[key]) and self._rank(key) < self._rank(top[-1]):
+                self._insert(top, key)
+            if len(top) < MAX_SUGGESTIONS:
+                del self._top[prefix]
+
+    def _has_available(self, entry):
+        return any(self._books[book_id][2] for book_id in entry['ids'])
+
+    def suggest(self, prefix, limit=10):
+        #best scoring titles and authors starting with prefix, ties alphabetically
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        limit = min(limit, MAX_SUGGESTIONS)
+
+        with self._lock:
+            top = self._ranked(prefix)
+            return [{'text': self._entries[key]['text'],
+                     'type': self._entries[key]['type'],
+                     'score': self._entries[key]['score']} for key in top[:limit]]
+
+    def _ranked(self, prefix):
+        top = self._top.get(prefix)
+        if top is not None:
+            return top
+        start = bisect_left(self._keys, prefix)
+        end = bisect_left(self._keys, prefix + '\uffff', start)
+        candidates = (key for key in self._keys[start:end]
+                      if self._has_available(self._entries[key]))
+        top = heapq.nsmallest(TOP_KEEP, candidates, key=self._rank)
+        if end - start > SCAN_LIMIT and len(top) == TOP_KEEP:
+            self._top[prefix] = top
+        return top
+
+    def stats(self):
+        with self._lock:
+            return {
+                'keys': len(self._keys),
+                'books': len(self._books),
+                'cached_prefixes': len(self._top)
+            }
+
+suggest_index = SuggestIndex()
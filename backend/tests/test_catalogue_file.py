@@ -0,0 +1,98 @@
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+from catalogue import CatalogueSnapshot
+from catalogue_file import CatalogueFile, MappedSnapshot, write_snapshot
+
+TITLES = ['Dune', 'dune', 'Émile', 'Ulysses', 'Beloved', 'Ivanhoe']
+
+def random_book(rng, book_id):
+    return {'id': book_id, 'title': f'{rng.choice(TITLES)} {rng.randint(0, 3)}',
+            'author': rng.choice(['Ann', 'bob', 'Cé']),
+            'price_buy': Decimal(rng.randint(100, 999)).scaleb(-2), 'price_rent': Decimal('1.50'),
+            'available': rng.randint(0, 1), 'created_at': datetime(2020, 1, 1, 12, 0, 0, 250),
+            'updated_at': datetime(2020, 1, 1) + timedelta(seconds=rng.randint(0, 100))}
+
+def walk(store, column, descending, limit):
+    #every page in turn, each one continuing after the last book of the one before
+    books, after = [], None
+    while True:
+        page = store.page(column, limit, descending, after)
+        books += page
+        if len(page) < limit:
+            return books
+        after = (page[-1][column], page[-1]['id'])
+
+def assert_same(store, expected):
+    #the file store answers exactly like the in-memory one
+    assert store.ids() == expected.ids()
+    assert {key: store.stats()[key] for key in ('books', 'available')} == expected.stats()
+    for book_id in range(0, 75):
+        assert store.get(book_id) == expected.get(book_id)
+    assert store.get_many([1, 2, 70, 1]) == expected.get_many([1, 2, 70, 1])
+    for column in ('title', 'author', 'price_buy'):
+        for descending in (False, True):
+            full = expected.page(column, None, descending)
+            assert store.page(column, None, descending) == full
+            assert walk(store, column, descending, 7) == full
+            match = lambda book: '1' in book['title']
+            assert store.page(column, 5, descending, None, match) == expected.page(column, 5, descending, None, match)
+
+def test_round_trip(tmp_path):
+    rows = [random_book(random.Random(book_id), book_id) for book_id in (5, 1, 3)]
+    rows[1]['created_at'] = None
+    path = str(tmp_path / 'catalogue.bin')
+    write_snapshot(path, rows)
+    mapped = MappedSnapshot(path)
+    assert (mapped.count, mapped.available) == (3, sum(row['available'] for row in rows))
+    assert [mapped.row(slot) for slot in range(3)] == sorted(rows, key=lambda row: row['id'])
+    assert mapped.slot(3) == 1 and mapped.slot(4) is None
+
+def test_paging_and_queued_edits_match_memory_store(tmp_path):
+    rng = random.Random(5)
+    table = {book_id: random_book(rng, book_id) for book_id in range(1, 60)}
+    #rebuilds wait on this, so edits sit in the overlay until it is set
+    rebuild = threading.Event()
+    rebuild.set()
+
+    def loader():
+        rebuild.wait()
+        return [dict(row) for row in table.values()]
+
+    store = CatalogueFile(str(tmp_path / 'catalogue.bin'))
+    store.load(loader)
+    expected = CatalogueSnapshot(('title', 'author', 'price_buy'))
+    expected.load(loader)
+    assert store.ready
+    assert_same(store, expected)
+
+    rebuild.clear()
+    for step in range(300):
+        book_id = rng.randint(1, 70)
+        if rng.random() < 0.2:
+            table.pop(book_id, None)
+            store.remove(book_id)
+            expected.remove(book_id)
+        else:
+            table[book_id] = random_book(rng, book_id)
+            store.upsert(dict(table[book_id]))
+            expected.upsert(dict(table[book_id]))
+        if step % 50 == 0:
+            assert_same(store, expected)
+    assert_same(store, expected)
+
+    rebuild.set()
+    for _ in range(500):
+        if not store._pending():
+            break
+        time.sleep(0.01)
+    assert not store._pending()
+    assert_same(store, expected)
+
+def test_load_runs_catch_up_before_ready(tmp_path):
+    store = CatalogueFile(str(tmp_path / 'catalogue.bin'))
+    seen = []
+    store.load(lambda: [random_book(random.Random(1), 1)], lambda: seen.append(store.ready))
+    assert seen == [False] and store.ready
@@ -0,0 +1,82 @@
+import random
+from decimal import Decimal
+from catalogue_index import CatalogueIndex, normalize
+
+TITLES = ['Dune', 'Emma', 'Ulysses', 'Beloved', 'Ivanhoe', 'Rebecca']
+AUTHORS = ['Frank Herbert', 'Jane Austen', 'jane  austen', 'James Joyce', 'Toni Morrison']
+
+def random_book(rng, book_id):
+    return {'id': book_id, 'title': f'{rng.choice(TITLES)} {rng.randint(1, 9)}',
+            'author': rng.choice(AUTHORS),
+            #few distinct prices, so equal prices have to be ordered by id
+            'price_buy': Decimal(rng.randint(1, 8)), 'price_rent': Decimal(rng.randint(1, 4)).scaleb(-1),
+            'available': rng.random() < 0.7}
+
+def expected(books, price='buy', min_price=None, max_price=None, author=None,
+             available=True, keyword='', sort='title', descending=False):
+    #every matching id in order, worked out from the rows
+    field = 'price_buy' if price == 'buy' else 'price_rent'
+    keyword = normalize(keyword)
+    keys = []
+    for book in books.values():
+        value = float(book[field])
+        if min_price is not None and value < min_price or max_price is not None and value > max_price:
+            continue
+        if author is not None and normalize(book['author']) != normalize(author):
+            continue
+        if available is not None and bool(book['available']) != available:
+            continue
+        if keyword and keyword not in normalize(book['title']) and keyword not in normalize(book['author']):
+            continue
+        sort_value = value if sort == 'price' else normalize(book[sort])
+        keys.append((sort_value, book['id']))
+    keys.sort(reverse=descending)
+    return [book_id for key, book_id in keys]
+
+def walk(index, limit, **query):
+    #every page in turn, following the cursors
+    ids, after = [], None
+    while True:
+        page, last, total = index.query(after=after, limit=limit, **query)
+        ids += page
+        if last is None:
+            return ids, total
+        after = last
+
+def test_paging_matches_brute_force():
+    rng = random.Random(11)
+    books = {book_id: random_book(rng, book_id) for book_id in range(1, 151)}
+    index = CatalogueIndex()
+    index.build(books.values())
+
+    for step in range(400):
+        book_id = rng.randint(1, 170)
+        if rng.random() < 0.8:
+            books[book_id] = random_book(rng, book_id)
+            book = books[book_id]
+            index.upsert(book_id, book['title'], book['author'], book['price_buy'], book['price_rent'], book['available'])
+        else:
+            books.pop(book_id, None)
+            index.remove(book_id)
+
+        query = {
+            'price': rng.choice(['buy', 'rent']),
+            'min_price': rng.choice([None, 0.2, 2, 3.5]),
+            'max_price': rng.choice([None, 0.3, 5, 8]),
+            'author': rng.choice([None, None, 'Jane Austen', 'frank herbert', 'Nobody']),
+            'available': rng.choice([True, False, None]),
+            'keyword': rng.choice(['', '', 'dune', 'e 3', 'austen']),
+            'sort': rng.choice(['title', 'author', 'price']),
+            'descending': rng.random() < 0.5,
+        }
+        ids, total = walk(index, rng.randint(1, 12), **query)
+        assert ids == expected(books, **query)
+        assert total == len(ids)
+
+def test_cursor_is_the_last_books_sort_key():
+    index = CatalogueIndex()
+    index.build([{'id': book_id, 'title': title, 'author': 'A', 'price_buy': 5, 'price_rent': 1, 'available': True}
+                 for book_id, title in ((1, 'Dune'), (2, 'Emma'), (3, 'dune'))])
+    assert index.query(sort='title', limit=2) == ([1, 3], ('dune', 3), 3)
+    assert index.query(sort='title', limit=2, after=('dune', 3)) == ([2], None, 3)
+    assert index.query(sort='price', limit=2, descending=True) == ([3, 2], (5.0, 2), 3)
@@ -0,0 +1,91 @@
+import threading
+import pytest
+fakeredis = pytest.importorskip('fakeredis')
+from cache import SimpleCache, TieredCache
+from redis_cache import RedisCache
+
+@pytest.fixture
+def server():
+    return fakeredis.FakeServer()
+
+def worker(server):
+    #one RedisCache per worker, all talking to the same server
+    return RedisCache(fakeredis.FakeRedis(server=server))
+
+def test_set_get_and_tags(server):
+    cache = worker(server)
+    cache.set('books:all', [1, 2], ttl_seconds=60, tags={'books:list'})
+    cache.set('book:1', {'id': 1}, ttl_seconds=60, tags={'book:1'})
+    assert cache.get('books:all') == [1, 2]
+    assert cache.get_many(['books:all', 'book:1', 'book:2']) == {'books:all': [1, 2], 'book:1': {'id': 1}}
+
+    assert cache.invalidate_tags('books:list') == 1
+    assert cache.get('books:all') is None
+    assert cache.get('book:1') == {'id': 1}
+
+def test_stale_value_served_then_refreshed(server):
+    cache = worker(server)
+    cache.set('books:all', 'old', ttl_seconds=0, stale_seconds=60)
+    assert cache.get('books:all') is None
+    refreshed = threading.Event()
+
+    def load():
+        refreshed.set()
+        return 'new'
+
+    assert cache.get_or_load('books:all', load, ttl_seconds=60) == 'old'
+    assert refreshed.wait(5)
+    for _ in range(100):
+        if cache.get('books:all') == 'new':
+            break
+        threading.Event().wait(0.01)
+    assert cache.get('books:all') == 'new'
+
+def test_load_overlapping_another_workers_invalidation_is_dropped(server):
+    loading, editor = worker(server), worker(server)
+
+    def load():
+        #another worker edits a book while this one is reading the old rows
+        editor.invalidate_tags('books:list')
+        return 'before the edit'
+
+    assert loading.get_or_load('books:all', load, ttl_seconds=60, tags={'books:list'}) == 'before the edit'
+    assert loading.get('books:all') is None
+
+    assert loading.get_or_load('books:all', lambda: 'after the edit', ttl_seconds=60) == 'after the edit'
+    assert editor.get('books:all') == 'after the edit'
+
+def test_tiered_load_overlapping_another_workers_invalidation_is_dropped(server):
+    loading = TieredCache(SimpleCache(), worker(server))
+    editor = TieredCache(SimpleCache(), worker(server))
+
+    def load():
+        editor.delete('books:all')
+        return 'before the edit'
+
+    loading.get_or_load('books:all', load, ttl_seconds=60)
+    assert loading.get('books:all') is None
+    assert editor.get('books:all') is None
+
+def test_term_tags_come_from_the_index(server, monkeypatch):
+    cache = worker(server)
+    cache.set('books:all:dune', [1], ttl_seconds=60, tags={'term:dune', 'book:1'})
+    cache.set('books:all:herbert', [1], ttl_seconds=60, tags={'term:herbert', 'book:1'})
+
+    def no_scan(*args, **kwargs):
+        raise AssertionError('tags_with_prefix scanned the keyspace')
+
+    monkeypatch.setattr(cache.client, 'scan_iter', no_scan)
+    assert sorted(cache.tags_with_prefix('term:')) == ['term:dune', 'term:herbert']
+
+    cache.invalidate_tags('term:dune')
+    assert cache.tags_with_prefix('term:') == ['term:herbert']
+    assert cache.get('books:all:dune') is None
+    assert cache.get('books:all:herbert') == [1]
+
+def test_clear(server):
+    cache = worker(server)
+    cache.set('books:all', [1], ttl_seconds=60, tags={'books:list', 'term:dune'})
+    cache.clear()
+    assert cache.get('books:all') is None
+    assert cache.tags_with_prefix('term:') == []
@@ -0,0 +1,62 @@
+import random
+from search_index import TrigramIndex, normalize
+
+WORDS = ['dune', 'hobbit', 'emma', 'ulysses', 'beloved', 'ivanhoe', 'rebecca', 'dracula']
+AUTHORS = ['Frank Herbert', 'J. R. R. Tolkien', 'Jane Austen', 'James Joyce', 'Toni Morrison']
+
+def rows(books):
+    return [{'id': book_id, 'title': title, 'author': author, 'available': available}
+            for book_id, (title, author, available) in books.items()]
+
+def substring_matches(books, query):
+    #what LIKE '%query%' on title or author returns, ordered by title then author
+    query = normalize(query)
+    found = [(f'{normalize(title)}\0{normalize(author)}', book_id)
+             for book_id, (title, author, available) in books.items()
+             if available and (query in normalize(title) or query in normalize(author))]
+    return [book_id for text, book_id in sorted(found)]
+
+def random_book(rng, book_id):
+    #the id keeps every title unique, so the title order has no ties
+    return f'{rng.choice(WORDS)} {rng.choice(WORDS)} {book_id}', rng.choice(AUTHORS), rng.random() < 0.8
+
+def test_search_matches_like_scan_through_compactions():
+    rng = random.Random(3)
+    books = {book_id: random_book(rng, book_id) for book_id in range(1, 201)}
+    index = TrigramIndex()
+    index.build(rows(books))
+
+    queries = ['dune', 'hob', 'emma ul', 'austen', 'cca 1', 'du', 'zzz']
+    compactions = 0
+    for step in range(4000):
+        book_id = rng.randint(1, 220)
+        if rng.random() < 0.85:
+            books[book_id] = random_book(rng, book_id)
+            retired = index.stats()['retired_slots']
+            index.upsert(book_id, *books[book_id])
+            if index.stats()['retired_slots'] < retired:
+                compactions += 1
+        else:
+            books.pop(book_id, None)
+            index.remove(book_id)
+        if step % 50 == 0:
+            for query in queries:
+                assert index.search(query, fuzzy_similarity=0) == substring_matches(books, query)
+    assert compactions > 0
+
+    #compacted or not, the index answers like one built from the same rows,
+    #near misses included
+    fresh = TrigramIndex()
+    fresh.build(rows(books))
+    assert index.stats()['books'] == fresh.stats()['books'] == len(books)
+    for query in queries + ['dracla', 'tolkein', 'beloveed']:
+        assert index.search(query) == fresh.search(query)
+
+def test_near_misses_when_nothing_matches():
+    index = TrigramIndex()
+    index.build([{'id': 1, 'title': 'The Hobbit', 'author': 'J. R. R. Tolkien', 'available': True},
+                 {'id': 2, 'title': 'Dracula', 'author': 'Bram Stoker', 'available': True},
+                 {'id': 3, 'title': 'The Hobbit', 'author': 'Someone Else', 'available': False}])
+    assert index.search('hobbit') == [1]
+    assert index.search('hobit') == [1]
+    assert index.search('hobit', fuzzy_similarity=0) == []
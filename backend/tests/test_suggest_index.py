@@ -0,0 +1,69 @@
+import random
+import suggest_index
+from suggest_index import SuggestIndex, MAX_SUGGESTIONS, normalize
+
+WORDS = ['dune', 'duel', 'dust', 'emma', 'ember', 'echo', 'dusk', 'eden']
+AUTHORS = ['Dan Brown', 'Dana Stone', 'Eve Park', 'Edith Wharton', 'Doris Lessing']
+
+def brute_force(books, popularity, prefix, limit):
+    #every title/author key starting with prefix, scored from scratch
+    prefix = normalize(prefix)
+    entries = {}
+    for book_id, (title, author, available) in books.items():
+        for text, kind in ((title, 'title'), (author, 'author')):
+            key = f'{normalize(text)}\0{kind}'
+            entry = entries.setdefault(key, {'text': text.strip(), 'type': kind, 'score': 0, 'available': False})
+            if available:
+                entry['score'] += popularity.get(book_id, 0)
+                entry['available'] = True
+    keys = sorted((key for key, entry in entries.items() if key.startswith(prefix) and entry['available']),
+                  key=lambda key: (-entries[key]['score'], key))
+    return [{'text': entries[key]['text'], 'type': entries[key]['type'], 'score': entries[key]['score']}
+            for key in keys[:limit]]
+
+def random_book(rng):
+    title = f'{rng.choice(WORDS)} {rng.choice(WORDS)} {rng.randint(1, 40)}'
+    return title, rng.choice(AUTHORS), rng.random() < 0.8
+
+def test_remembered_lists_match_brute_force(monkeypatch):
+    #a low SCAN_LIMIT makes the one and two letter prefixes keep remembered
+    #lists, which are then patched by every edit instead of rescanned
+    monkeypatch.setattr(suggest_index, 'SCAN_LIMIT', 5)
+    rng = random.Random(7)
+    books = {book_id: random_book(rng) for book_id in range(1, 301)}
+    popularity = {book_id: rng.randint(0, 5) for book_id in books}
+    index = SuggestIndex()
+    index.build(({'id': book_id, 'title': title, 'author': author, 'available': available}
+                 for book_id, (title, author, available) in books.items()), popularity)
+    assert index.stats()['cached_prefixes'] > 0
+
+    prefixes = ['d', 'e', 'du', 'dus', 'em', 'ed', 'dan']
+    for step in range(3000):
+        action = rng.random()
+        book_id = rng.randint(1, 350)
+        if action < 0.4:
+            books[book_id] = random_book(rng)
+            index.upsert(book_id, *books[book_id])
+        elif action < 0.55:
+            books.pop(book_id, None)
+            index.remove(book_id)
+        elif action < 0.85:
+            ordered = [rng.randint(1, 350) for _ in range(rng.randint(1, 3))]
+            for ordered_id in ordered:
+                popularity[ordered_id] = popularity.get(ordered_id, 0) + 1
+            index.record_orders(ordered)
+        else:
+            popularity = {key: max(0, count + rng.randint(-3, 1)) for key, count in popularity.items()}
+            index.set_popularity(popularity)
+
+        prefix = prefixes[step % len(prefixes)]
+        assert index.suggest(prefix, MAX_SUGGESTIONS) == brute_force(books, popularity, prefix, MAX_SUGGESTIONS)
+
+def test_suggest_limit_and_blank_prefix():
+    index = SuggestIndex()
+    index.build([{'id': 1, 'title': 'Dune', 'author': 'Frank Herbert', 'available': True},
+                 {'id': 2, 'title': 'Dune Messiah', 'author': 'Frank Herbert', 'available': True},
+                 {'id': 3, 'title': 'Dust', 'author': 'Hugh Howey', 'available': False}], {2: 3})
+    assert [item['text'] for item in index.suggest('du', 10)] == ['Dune Messiah', 'Dune']
+    assert index.suggest('du', 1) == [{'text': 'Dune Messiah', 'type': 'title', 'score': 3}]
+    assert index.suggest('  ', 10) == []
@@ -0,0 +1,5 @@
+-- for databases created before schema.sql had this change, run once
+USE bookstore;
+
+-- keyset pagination of GET /api/manager/orders filtered by payment_status
+ALTER TABLE orders ADD INDEX idx_status_created (payment_status, created_at, id);
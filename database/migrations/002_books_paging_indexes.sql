@@ -0,0 +1,8 @@
+-- for databases created before schema.sql had this change, run once
+USE bookstore;
+
+-- paged and sorted GET /api/books
+ALTER TABLE books
+    ADD INDEX idx_available_title (available, title, id),
+    ADD INDEX idx_available_author (available, author, id),
+    ADD INDEX idx_available_price (available, price_buy, id);
@@ -0,0 +1,6 @@
+-- for databases created before schema.sql had this change, run once
+USE bookstore;
+
+-- full text book search (SEARCH_ENGINE=fulltext, the default), until this has run
+-- each worker falls back to the LIKE scan and keeps using it until restarted
+ALTER TABLE books ADD FULLTEXT INDEX ft_title_author (title, author);
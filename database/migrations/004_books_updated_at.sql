@@ -0,0 +1,5 @@
+-- for databases created before schema.sql had this change, run once
+USE bookstore;
+
+-- periodic catalogue reconcile (CATALOGUE_SNAPSHOT=True) looks up recently changed books
+ALTER TABLE books ADD INDEX idx_updated_at (updated_at);
@@ -25,7 +25,12 @@ CREATE TABLE IF NOT EXISTS books (
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
     INDEX idx_title (title),
     INDEX idx_author (author),
-    INDEX idx_available (available)
+    INDEX idx_available (available),
+    INDEX idx_available_title (available, title, id),
+    INDEX idx_available_author (available, author, id),
+    INDEX idx_available_price (available, price_buy, id),
+    INDEX idx_updated_at (updated_at),
+    FULLTEXT INDEX ft_title_author (title, author)
 )
 
 CREATE TABLE IF NOT EXISTS orders (
@@ -37,7 +42,8 @@ CREATE TABLE IF NOT EXISTS orders (
     FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
     INDEX idx_user_id (user_id),
     INDEX idx_payment_status (payment_status),
-    INDEX idx_created_at (created_at)
+    INDEX idx_created_at (created_at),
+    INDEX idx_status_created (payment_status, created_at, id)
 )
 
 CREATE TABLE IF NOT EXISTS order_items (
@@ -96,6 +96,69 @@ class APIClient:
         except Exception as e:
             return False, f"Search failed: {str(e)}"
     
+    def get_books_page(self, keyword: str = "", sort: str = "title", order: str = "asc",
+                       cursor: Optional[str] = None, limit: int = 100) -> Tuple[bool, any]:
+        #returns (books, next_cursor), next_cursor is None on the last page
+        try:
+            #only the columns the books table shows
+            params = {'sort': sort, 'order': order, 'limit': limit,
+                      'fields': 'id,title,author,price_buy,price_rent'}
+            if keyword:
+                params['q'] = keyword
+            if cursor:
+                params['cursor'] = cursor
+            
+            response = requests.get(f'{self.base_url}/api/books', params=params, timeout=10)
+            success, data = self._handle_response(response)
+            
+            if success:
+                return True, (data['books'], data['next_cursor'])
+            else:
+                return False, data
+                
+        except requests.exceptions.ConnectionError:
+            return False, "Cannot connect to server"
+        except Exception as e:
+            return False, f"Search failed: {str(e)}"
+    
+    def suggest_books(self, prefix: str, limit: int = 10) -> Tuple[bool, any]:
+        try:
+            response = requests.get(
+                f'{self.base_url}/api/books/suggest',
+                params={'prefix': prefix, 'limit': limit},
+                timeout=2
+            )
+            success, data = self._handle_response(response)
+            
+            if success:
+                return True, [suggestion['text'] for suggestion in data['suggestions']]
+            else:
+                return False, data
+                
+        except requests.exceptions.ConnectionError:
+            return False, "Cannot connect to server"
+        except Exception as e:
+            return False, f"Suggest failed: {str(e)}"
+    
+    def get_books_by_ids(self, book_ids: List[int]) -> Tuple[bool, any]:
+        try:
+            response = requests.get(
+                f'{self.base_url}/api/books',
+                params={'ids': ','.join(str(book_id) for book_id in book_ids)},
+                timeout=10
+            )
+            success, data = self._handle_response(response)
+            
+            if success:
+                return True, data['books']
+            else:
+                return False, data
+                
+        except requests.exceptions.ConnectionError:
+            return False, "Cannot connect to server"
+        except Exception as e:
+            return False, f"Failed to get books: {str(e)}"
+    
     def create_order(self, items: List[Dict]) -> Tuple[bool, any]:
         try:
             response = requests.post(
@@ -132,6 +195,30 @@ class APIClient:
         except Exception as e:
             return False, f"Failed to get orders: {str(e)}"
     
+    def get_orders_page(self, limit: int = 100, cursor: Optional[str] = None) -> Tuple[bool, any]:
+        #returns (orders, next_cursor), next_cursor is None on the last page
+        try:
+            params = {'limit': limit}
+            if cursor:
+                params['cursor'] = cursor
+            response = requests.get(
+                f'{self.base_url}/api/manager/orders',
+                params=params,
+                headers=self._get_headers(),
+                timeout=10
+            )
+            success, data = self._handle_response(response)
+            
+            if success:
+                return True, (data['orders'], data['next_cursor'])
+            else:
+                return False, data
+                
+        except requests.exceptions.ConnectionError:
+            return False, "Cannot connect to server"
+        except Exception as e:
+            return False, f"Failed to get orders: {str(e)}"
+    
     def get_order_details(self, order_id: int) -> Tuple[bool, any]:
         try:
             response = requests.get(
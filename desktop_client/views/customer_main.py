@@ -4,11 +4,22 @@ import threading
 
 class CustomerMainView(tk.Frame):
     
+    #label -> (sort, order) for GET /api/books
+    SORT_OPTIONS = {
+        "Title": ("title", "asc"),
+        "Author": ("author", "asc"),
+        "Price: Low-High": ("price", "asc"),
+        "Price: High-Low": ("price", "desc")
+    }
+    
     def __init__(self, parent, api_client, on_logout):
         super().__init__(parent)
         self.api_client = api_client
         self.on_logout = on_logout
         self.cart = []
+        self.books_cursor = None
+        self.books_query = ("", "title", "asc")
+        self.suggest_job = None
         
         self.pack(fill=tk.BOTH, expand=True)
         self.create_widgets()
@@ -43,9 +54,12 @@ class CustomerMainView(tk.Frame):
         
         ttk.Label(search_frame, text="Search:", font=('Arial', 10)).pack(side=tk.LEFT, padx=(0, 5))
         
-        self.search_entry = ttk.Entry(search_frame, font=('Arial', 10))
+        #suggestions fill the dropdown while typing, picking one searches for it
+        self.search_entry = ttk.Combobox(search_frame, font=('Arial', 10))
         self.search_entry.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5)
         self.search_entry.bind('<Return>', lambda e: self.search_books())
+        self.search_entry.bind('<KeyRelease>', self.schedule_suggest)
+        self.search_entry.bind('<<ComboboxSelected>>', lambda e: self.search_books())
         
         self.search_button = ttk.Button(
             search_frame,
@@ -54,6 +68,19 @@ class CustomerMainView(tk.Frame):
         )
         self.search_button.pack(side=tk.LEFT)
         
+        ttk.Label(search_frame, text="Sort:", font=('Arial', 10)).pack(side=tk.LEFT, padx=(10, 5))
+        
+        self.sort_var = tk.StringVar(value="Title")
+        sort_box = ttk.Combobox(
+            search_frame,
+            textvariable=self.sort_var,
+            values=list(self.SORT_OPTIONS),
+            state='readonly',
+            width=12
+        )
+        sort_box.pack(side=tk.LEFT)
+        sort_box.bind('<<ComboboxSelected>>', lambda e: self.search_books())
+        
         self.status_label = ttk.Label(left_frame, text="", foreground="blue")
         self.status_label.pack(fill=tk.X, pady=(0, 5))
         
@@ -102,6 +129,14 @@ class CustomerMainView(tk.Frame):
             command=lambda: self.add_to_cart('rent')
         ).pack(side=tk.LEFT)
         
+        self.load_more_button = ttk.Button(
+            button_frame,
+            text="Load More",
+            command=self.load_more_books,
+            state='disabled'
+        )
+        self.load_more_button.pack(side=tk.RIGHT)
+        
         right_frame = ttk.LabelFrame(content_frame, text="Shopping Cart", padding="10")
         right_frame.pack(side=tk.RIGHT, fill=tk.BOTH)
         right_frame.config(width=300)
@@ -152,33 +187,41 @@ class CustomerMainView(tk.Frame):
     
     def load_all_books(self):
         self.status_label.config(text="Loading books...", foreground="blue")
+        self.books_query = ("",) + self.SORT_OPTIONS[self.sort_var.get()]
+        query = self.books_query
         
         def load_thread():
-            success, data = self.api_client.search_books("")
+            success, data = self.api_client.get_books_page(*query)
             self.after(0, lambda: self.handle_books_response(success, data))
         
         threading.Thread(target=load_thread, daemon=True).start()
     
-    def handle_books_response(self, success, data):
+    def handle_books_response(self, success, data, append=False):
         if success:
-            books = data
+            books, self.books_cursor = data
+            self.display_books(books, append)
+            shown = len(self.books_tree.get_children())
+            verb = "Found" if self.books_query[0] else "Loaded"
+            more = " (more available)" if self.books_cursor else ""
             self.status_label.config(
-                text=f"Loaded {len(books)} book(s)",
+                text=f"{verb} {shown} book(s){more}",
                 foreground="green"
             )
-            self.display_books(books)
+            self.load_more_button.config(state='normal' if self.books_cursor else 'disabled')
         else:
             self.status_label.config(text=f"Error: {data}", foreground="red")
             messagebox.showerror("Load Failed", data)
     
     def search_books(self):
         keyword = self.search_entry.get().strip()
+        self.books_query = (keyword,) + self.SORT_OPTIONS[self.sort_var.get()]
+        query = self.books_query
         
         self.search_button.config(state='disabled')
         self.status_label.config(text="Searching...", foreground="blue")
         
         def search_thread():
-            success, data = self.api_client.search_books(keyword)
+            success, data = self.api_client.get_books_page(*query)
             self.after(0, lambda: self.handle_search_response(success, data))
         
         threading.Thread(target=search_thread, daemon=True).start()
@@ -187,19 +230,56 @@ class CustomerMainView(tk.Frame):
         self.search_button.config(state='normal')
         
         if success:
-            books = data
-            self.status_label.config(
-                text=f"Found {len(books)} book(s)",
-                foreground="green"
-            )
-            self.display_books(books)
+            self.handle_books_response(success, data)
         else:
             self.status_label.config(text=f"Error: {data}", foreground="red")
             messagebox.showerror("Search Failed", data)
     
-    def display_books(self, books):
-        for item in self.books_tree.get_children():
-            self.books_tree.delete(item)
+    def load_more_books(self):
+        #next page of whatever was last loaded or searched
+        if not self.books_cursor:
+            return
+        self.status_label.config(text="Loading more books...", foreground="blue")
+        query = self.books_query
+        cursor = self.books_cursor
+        
+        def load_thread():
+            success, data = self.api_client.get_books_page(*query, cursor=cursor)
+            self.after(0, lambda: self.handle_books_response(success, data, append=True))
+        
+        threading.Thread(target=load_thread, daemon=True).start()
+    
+    def schedule_suggest(self, event):
+        #wait for a pause in typing before asking the server
+        if event.keysym in ('Return', 'Up', 'Down', 'Escape'):
+            return
+        if self.suggest_job:
+            self.after_cancel(self.suggest_job)
+        self.suggest_job = self.after(150, self.load_suggestions)
+    
+    def load_suggestions(self):
+        self.suggest_job = None
+        prefix = self.search_entry.get().strip()
+        if not prefix:
+            self.search_entry.config(values=[])
+            return
+        
+        def suggest_thread():
+            success, data = self.api_client.suggest_books(prefix)
+            if success:
+                self.after(0, lambda: self.show_suggestions(prefix, data))
+        
+        threading.Thread(target=suggest_thread, daemon=True).start()
+    
+    def show_suggestions(self, prefix, suggestions):
+        #ignore answers for text the user has already changed
+        if self.search_entry.get().strip() == prefix:
+            self.search_entry.config(values=suggestions)
+    
+    def display_books(self, books, append=False):
+        if not append:
+            for item in self.books_tree.get_children():
+                self.books_tree.delete(item)
         
         for book in books:
             self.books_tree.insert('', tk.END, values=(
@@ -271,6 +351,34 @@ class CustomerMainView(tk.Frame):
         if not self.cart:
             return
         
+        self.checkout_button.config(state='disabled')
+        self.status_label.config(text="Checking prices...", foreground="blue")
+        
+        book_ids = [item['book_id'] for item in self.cart]
+        
+        #latest prices for the whole cart in one call
+        def prices_thread():
+            success, data = self.api_client.get_books_by_ids(book_ids)
+            self.after(0, lambda: self.handle_prices_response(success, data))
+        
+        threading.Thread(target=prices_thread, daemon=True).start()
+    
+    def handle_prices_response(self, success, data):
+        self.checkout_button.config(state='normal')
+        self.status_label.config(text="")
+        
+        #if this fails the server still charges current prices
+        if success:
+            books = {book['id']: book for book in data}
+            for item in self.cart:
+                book = books.get(item['book_id'])
+                if book:
+                    item['price'] = book['price_buy'] if item['type'] == 'buy' else book['price_rent']
+            self.update_cart_display()
+        
+        self.confirm_checkout()
+    
+    def confirm_checkout(self):
         total = sum(item['price'] for item in self.cart)
         if not messagebox.askyesno(
             "Confirm Order",
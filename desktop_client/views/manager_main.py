@@ -8,6 +8,7 @@ class ManagerMainView(tk.Frame):
         super().__init__(parent)
         self.api_client = api_client
         self.on_logout = on_logout
+        self.orders_cursor = None
         
         self.pack(fill=tk.BOTH, expand=True)
         self.create_widgets()
@@ -54,6 +55,14 @@ class ManagerMainView(tk.Frame):
             command=self.load_orders
         ).pack(side=tk.LEFT, padx=5)
         
+        self.load_more_button = ttk.Button(
+            controls_frame,
+            text="Load More",
+            command=self.load_more_orders,
+            state=tk.DISABLED
+        )
+        self.load_more_button.pack(side=tk.LEFT, padx=5)
+        
         self.orders_status = ttk.Label(controls_frame, text="", foreground="blue")
         self.orders_status.pack(side=tk.LEFT, padx=10)
         
@@ -119,33 +128,50 @@ class ManagerMainView(tk.Frame):
         ).pack(side=tk.LEFT, padx=5)
     
     def load_orders(self):
-        """Load all orders from API"""
+        """Load the first page of orders from API"""
         self.orders_status.config(text="Loading orders...", foreground="blue")
         
         def load_thread():
-            success, data = self.api_client.get_all_orders()
+            success, data = self.api_client.get_orders_page()
             self.after(0, lambda: self.handle_orders_response(success, data))
         
         threading.Thread(target=load_thread, daemon=True).start()
     
-    def handle_orders_response(self, success, data):
+    def load_more_orders(self):
+        """Load the next page of orders"""
+        if not self.orders_cursor:
+            return
+        self.orders_status.config(text="Loading more orders...", foreground="blue")
+        cursor = self.orders_cursor
+        
+        def load_thread():
+            success, data = self.api_client.get_orders_page(cursor=cursor)
+            self.after(0, lambda: self.handle_orders_response(success, data, append=True))
+        
+        threading.Thread(target=load_thread, daemon=True).start()
+    
+    def handle_orders_response(self, success, data, append=False):
         """Handle orders response"""
         if success:
-            orders = data
+            orders, self.orders_cursor = data
+            self.display_orders(orders, append)
+            shown = len(self.orders_tree.get_children())
+            more = " (more available)" if self.orders_cursor else ""
             self.orders_status.config(
-                text=f"Loaded {len(orders)} order(s)",
+                text=f"Loaded {shown} order(s){more}",
                 foreground="green"
             )
-            self.display_orders(orders)
+            self.load_more_button.config(state=tk.NORMAL if self.orders_cursor else tk.DISABLED)
         else:
             self.orders_status.config(text=f"Error: {data}", foreground="red")
             messagebox.showerror("Load Failed", data)
     
-    def display_orders(self, orders):
+    def display_orders(self, orders, append=False):
         """Display orders in tree"""
-        #Clear existing
-        for item in self.orders_tree.get_children():
-            self.orders_tree.delete(item)
+        #Clear existing unless this is the next page
+        if not append:
+            for item in self.orders_tree.get_children():
+                self.orders_tree.delete(item)
         
         #Add orders
         for order in orders: